@@ -0,0 +1,85 @@
+"""
+
+ ~ Host // Python 3 ~
+ bench_ingest.py : Loopback benchmark of the ingest server
+
+ Sender processes stream /sensor/<name> messages (optionally bundled) of
+ virtual boards over loopback, at a given rate or as fast as possible,
+ while the ingest server decodes them. Reports the messages sent and
+ ingested per second.
+
+ Usage : python bench_ingest.py [--senders 2] [--boards 8] [--bundle 16] [--rate 20000]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from ingest import IngestServer
+from osc.osc_prepared import OscPreparedMessage
+from osc.osc_bundle_builder import OscBundleWriter
+
+def sender(port: int, boards: list, bundle: int, duration: float, rate: float, sent):
+    """ Stream the values of the given boards (rate messages per second, 0 for max) """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    msg = OscPreparedMessage("/sensor/light", "iif")
+    writer = OscBundleWriter(1400)
+    n = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        for b_id in boards:
+            for i in range(max(1, bundle)):
+                dgram = msg.pack(b_id, i % 4, (n % 1000) / 1000)
+                if bundle:
+                    writer.add(dgram)
+                else:
+                    sock.sendto(dgram, ('127.0.0.1', port))
+                n += 1
+            if bundle:
+                sock.sendto(writer.dgram, ('127.0.0.1', port))
+                writer.reset()
+        if rate:
+            # Pace the stream to the target rate
+            ahead = n / rate - (time.perf_counter() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+    sent.value = n
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Loopback benchmark of the ingest server')
+    parser.add_argument('--port', type = int, default = 23240)
+    parser.add_argument('--senders', type = int, default = 2, help = 'Sender processes')
+    parser.add_argument('--boards', type = int, default = 8, help = 'Boards per sender')
+    parser.add_argument('--bundle', type = int, default = 16, help = 'Messages per bundle (0 for single messages)')
+    parser.add_argument('--rate', type = float, default = 20000., help = 'Messages per second of each sender (0 for max)')
+    parser.add_argument('--duration', type = float, default = 5.)
+    args = parser.parse_args()
+    server = IngestServer('127.0.0.1', args.port)
+    counters = [multiprocessing.Value('q', 0) for _ in range(args.senders)]
+    procs = [multiprocessing.Process(target = sender, args = (args.port,
+                list(range(s * args.boards, (s + 1) * args.boards)), args.bundle, args.duration, args.rate, counters[s]))
+             for s in range(args.senders)]
+    start = time.perf_counter()
+    cpu = time.process_time()
+    for p in procs:
+        p.start()
+    asyncio.run(server.serve(max_port = 0, emit_rate = 0, duration = args.duration + 0.5))
+    for p in procs:
+        p.join()
+    elapsed = args.duration
+    cpu = time.process_time() - cpu
+    sent = sum([c.value for c in counters])
+    print("sent     : %10d messages (%9.0f msg/s)" % (sent, sent / elapsed))
+    print("ingested : %10d messages (%9.0f msg/s) in %d datagrams, %d batches" % (
+        server.messages, server.messages / elapsed, server.datagrams, server.batches))
+    print("lost     : %.2f%% | ingest CPU %.1f%% | %d streams" % (
+        100. * (1 - server.messages / sent) if sent else 0., 100. * cpu / elapsed, len(server.table)))
@@ -0,0 +1,77 @@
+"""
+
+ ~ Host // Python 3 ~
+ clock_server.py : Host side of the board clock synchronisation
+
+ Answers each /sync/ping (board id, board time in us) with a /sync/pong
+ (board id, echoed board time, receive and transmit NTP timetags of the
+ host), sent back to the address the ping came from. Timetags are sent as
+ 64-bit integers ('h'), as boards parse them without any float.
+
+ Usage : python clock_server.py [--port 7375]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import time
+import socket
+import struct
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc import ntp
+from osc.osc_view import parse_message
+from osc.osc_message import ParseError
+from osc.osc_prepared import OscPreparedMessage
+
+def ntp_now() -> int:
+    """ Current host time as a signed 64-bit NTP timetag """
+    return struct.unpack('>q', ntp.system_time_to_ntp(time.time()))[0]
+
+class ClockServer:
+    """
+    Answers the synchronisation pings of the boards.
+    """
+
+    def __init__(self,
+            host: str = '0.0.0.0',
+            port: int = 7375,
+            verbose: bool = False):
+        self.verbose = verbose
+        self.pong = OscPreparedMessage("/sync/pong", "ihhh")
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.pings = 0
+
+    def handle(self, dgram: bytes, client) -> bool:
+        """ Answer a ping datagram, returns False if it was not a ping """
+        t2 = ntp_now()
+        try:
+            address, params = parse_message(dgram)
+        except ParseError:
+            return False
+        if address != "/sync/ping" or len(params) != 2:
+            return False
+        b_id, t1 = params
+        self.sock.sendto(self.pong.pack(b_id, t1, t2, ntp_now()), client)
+        self.pings += 1
+        if self.verbose:
+            print("Ping from board %d (%s:%d)" % (b_id, client[0], client[1]))
+        return True
+
+    def serve_forever(self):
+        while True:
+            dgram, client = self.sock.recvfrom(2048)
+            self.handle(dgram, client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Clock synchronisation server for the boards')
+    parser.add_argument('--host', type = str, default = '0.0.0.0')
+    parser.add_argument('--port', type = int, default = 7375)
+    parser.add_argument('--verbose', action = 'store_true')
+    args = parser.parse_args()
+    ClockServer(args.host, args.port, args.verbose).serve_forever()
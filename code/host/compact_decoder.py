@@ -0,0 +1,137 @@
+"""
+
+ ~ Host // Python 3 ~
+ compact_decoder.py : Host decoder of the compact sensor values
+
+ Receives the traffic of the boards (messages or bundles), expands each
+ compact word of the /c messages into a /sensor/<name> (board id, sensor
+ index, value) message with the float restored, as the board would send it
+ without compact mode, and forwards everything to Max. The names (and axes)
+ of the sensors come from the /connect message of each board, whose sensor
+ list holds index:type[:name[:axes]] entries. Values of boards not yet
+ connected go to /sensor/compact (board id, sensor field, value).
+
+ Usage : python compact_decoder.py [--port 2325] [--max_port 2324]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import socket
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc.osc_packet import OscPacket, ParseError
+from osc.osc_message import ParseError as MessageParseError
+from osc.osc_prepared import OscPreparedMessage
+from osc.osc_compact import COMPACT_ADDRESS, MAX_AXES, decode_compact
+
+# Address of the values of unknown sensors
+UNKNOWN_ADDRESS = '/sensor/compact'
+
+class SensorNames:
+    """
+    Names of the sensors of each board (from the /connect messages).
+
+    Example :
+    >>> names = SensorNames()
+    >>> names.connect(3, "0:light:light 1:gyroscope:gyro:3")
+    >>> names.resolve(3, 5) # Sensor 1, axis 1
+    ('/sensor/gyro', 1)
+    """
+
+    def __init__(self):
+        self.boards = {}
+
+    def connect(self, b_id: int, sensors_list: str):
+        """ Register the sensors of a board (index:type[:name[:axes]] entries) """
+        sensors = {}
+        for entry in sensors_list.split():
+            fields = entry.split(':')
+            try:
+                index = int(fields[0])
+                axes = int(fields[3]) if len(fields) > 3 else 1
+            except ValueError:
+                continue
+            if len(fields) > 1:
+                sensors[index] = ('/sensor/' + fields[min(2, len(fields) - 1)], axes)
+        self.boards[b_id] = sensors
+
+    def message(self, address: str, params):
+        """ Register the sensors of a /connect message (board id, type, sensor list) """
+        if (address == "/connect" and len(params) == 3 and isinstance(params[0], int)
+                and isinstance(params[2], str)):
+            self.connect(params[0], params[2])
+
+    def resolve(self, board: int, field: int):
+        """ Address and sensor index (axis of list values) of a compact sensor field """
+        sensor, axis = divmod(field, MAX_AXES)
+        info = self.boards.get(board, {}).get(sensor)
+        if info is None:
+            return UNKNOWN_ADDRESS, field
+        address, axes = info
+        return address, (axis if axes > 1 else sensor)
+
+class CompactDecoder:
+    """
+    Expands compact messages and forwards the traffic to Max.
+    """
+
+    def __init__(self,
+            host: str = '0.0.0.0',
+            port: int = 2325,
+            max_host: str = '127.0.0.1',
+            max_port: int = 2324):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.dest = (max_host, max_port)
+        self.names = SensorNames()
+        # Prepared value message of each address
+        self.values = {}
+        self.decoded = 0
+        self.errors = 0
+
+    def handle(self, dgram: bytes):
+        """ Forward a datagram, with its compact messages expanded """
+        if not dgram.startswith((b'#bundle', COMPACT_ADDRESS.encode() + b'\x00', b'/connect\x00')):
+            self.sock.sendto(dgram, self.dest)
+            return
+        try:
+            messages = OscPacket(dgram).messages
+        except ParseError:
+            self.errors += 1
+            return
+        for timed in messages:
+            message = timed.message
+            try:
+                # Messages of bundles are parsed on access
+                if message.address != COMPACT_ADDRESS:
+                    self.names.message(message.address, message.params)
+                    self.sock.sendto(message.dgram, self.dest)
+                    continue
+                words = decode_compact(message.params)
+            except MessageParseError:
+                self.errors += 1
+                continue
+            for board, field, value in words:
+                address, sensor = self.names.resolve(board, field)
+                msg = self.values.get(address)
+                if msg is None:
+                    msg = self.values[address] = OscPreparedMessage(address, "iif")
+                self.sock.sendto(msg.pack(board, sensor, value), self.dest)
+                self.decoded += 1
+
+    def serve_forever(self):
+        while True:
+            dgram, _ = self.sock.recvfrom(65536)
+            self.handle(dgram)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Decoder of the compact sensor values')
+    parser.add_argument('--port', type = int, default = 2325, help = 'Port the boards send to')
+    parser.add_argument('--max_host', type = str, default = '127.0.0.1')
+    parser.add_argument('--max_port', type = int, default = 2324, help = 'Port of Max (udpreceive)')
+    args = parser.parse_args()
+    CompactDecoder(port = args.port, max_host = args.max_host, max_port = args.max_port).serve_forever()
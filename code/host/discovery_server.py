@@ -0,0 +1,113 @@
+"""
+
+ ~ Host // Python 3 ~
+ discovery_server.py : Host side of the board discovery
+
+ Broadcasts the IP of the host on the discovery port (as the Max patch
+ does), and on the multicast group of the fleet if given. Also answers
+ each unicast /probe (board id) of a board trying its cached host with a
+ /probe/ack (board id), sent back to the address the probe came from.
+
+ Usage : python discovery_server.py [--port 7374] [--interval 100] [--group 224.1.1.1]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc.osc_view import parse_message
+from osc.osc_message import ParseError
+from osc.osc_prepared import OscPreparedMessage
+
+def local_ip() -> str:
+    """ IP of the interface used to reach the network """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(('10.255.255.255', 1))
+        return sock.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+    finally:
+        sock.close()
+
+class DiscoveryServer:
+    """
+    Announces the host and answers the probes of the boards.
+    """
+
+    def __init__(self,
+            host: str = '',
+            port: int = 7374,
+            interval_ms: int = 100,
+            broadcast: str = '255.255.255.255',
+            group: str = '',
+            group_port: int = 5007,
+            verbose: bool = False):
+        self.ip = host or local_ip()
+        self.port = port
+        self.interval = interval_ms / 1000
+        self.broadcast = (broadcast, port)
+        self.group = (group, group_port) if group else None
+        self.verbose = verbose
+        self.ack = OscPreparedMessage("/probe/ack", "i")
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        self.sock.bind(('', port))
+        self.probes = 0
+
+    def announce(self):
+        """ Broadcast the IP of the host (and send it to the group) """
+        if self.interval > 0:
+            self.sock.sendto(self.ip.encode() + b'\x00', self.broadcast)
+            if self.group is not None:
+                self.sock.sendto(self.ip.encode() + b'\x00', self.group)
+
+    def handle(self, dgram: bytes, client) -> bool:
+        """ Answer a probe datagram, returns False if it was not a probe """
+        try:
+            address, params = parse_message(dgram)
+        except ParseError:
+            return False
+        if address != "/probe" or len(params) != 1:
+            return False
+        self.sock.sendto(self.ack.pack(params[0]), client)
+        self.probes += 1
+        if self.verbose:
+            print("Probe from board %d (%s:%d)" % (params[0], client[0], client[1]))
+        return True
+
+    def serve_forever(self):
+        next_announce = time.monotonic()
+        while True:
+            if self.interval > 0:
+                now = time.monotonic()
+                if now >= next_announce:
+                    self.announce()
+                    next_announce = now + self.interval
+                self.sock.settimeout(max(0, next_announce - now))
+            try:
+                dgram, client = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            self.handle(dgram, client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Discovery server for the boards')
+    parser.add_argument('--ip', type = str, default = '', help = 'IP to announce (default: local IP)')
+    parser.add_argument('--port', type = int, default = 7374)
+    parser.add_argument('--interval', type = int, default = 100, help = 'Broadcast interval in ms (0 to only answer probes)')
+    parser.add_argument('--group', type = str, default = '', help = 'Multicast group to announce on (e.g. 224.1.1.1)')
+    parser.add_argument('--group_port', type = int, default = 5007)
+    parser.add_argument('--verbose', action = 'store_true')
+    args = parser.parse_args()
+    print("Announcing %s on port %d" % (args.ip or local_ip(), args.port))
+    DiscoveryServer(args.ip, args.port, args.interval,
+        group = args.group, group_port = args.group_port, verbose = args.verbose).serve_forever()
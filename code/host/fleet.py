@@ -0,0 +1,41 @@
+"""
+
+ ~ Host // Python 3 ~
+ fleet.py : Fleet-wide control of the boards (multicast)
+
+ Sends a single control message to the multicast group joined by all the
+ boards, whatever their number.
+   - rate <ms> : pause between two sensor reads (/fleet/rate)
+   - resync    : restart the clock synchronisation (/fleet/resync)
+
+ Usage : python fleet.py rate 10
+         python fleet.py resync
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import socket
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc.osc_prepared import OscTypedEncoder
+
+def send_fleet(command: str, args: list, group: str = '224.1.1.1', port: int = 5007):
+    """ Send /fleet/<command> with integer arguments to the group """
+    encoder = OscTypedEncoder("/fleet/" + command, "i" * len(args))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    sock.sendto(encoder.pack(*args), (group, port))
+    sock.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Fleet-wide control of the boards')
+    parser.add_argument('command', type = str, choices = ['rate', 'resync'])
+    parser.add_argument('args', type = int, nargs = '*')
+    parser.add_argument('--group', type = str, default = '224.1.1.1')
+    parser.add_argument('--port', type = int, default = 5007)
+    args = parser.parse_args()
+    send_fleet(args.command, args.args, args.group, args.port)
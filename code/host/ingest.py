@@ -0,0 +1,258 @@
+"""
+
+ ~ Host // Python 3 ~
+ ingest.py : Asyncio ingest server of the board traffic
+
+ Decodes the OSC messages and bundles of all boards (/sensor/<name> values,
+ /block/<name> sample blocks and /c compact values) into a table holding,
+ for each (address, board, sensor), the latest value, its rate and when it
+ was last seen. Selected streams are re-emitted to Max at a controlled rate,
+ as one bundle of the changed values per emission period. All values are
+ re-emitted as /sensor/<name> (board, sensor, value) messages, the names of
+ the compact values coming from the /connect message of their board (as in
+ compact_decoder.py).
+
+ The socket is drained in batches from a reader callback (the datagram
+ protocol of asyncio reads a single datagram per loop iteration), while the
+ emission to Max goes through an asyncio datagram endpoint.
+
+ Usage : python ingest.py [--port 2324] [--max_port 2325] [--emit_rate 100]
+                          [--select /sensor/light] [--select 3:0]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import time
+import struct
+import socket
+import asyncio
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc.dispatcher import Dispatcher
+from osc.osc_message import ParseError
+from osc.osc_types import BuildError
+from osc.osc_block import decode_block
+from osc.osc_compact import COMPACT_ADDRESS, decode_compact
+from osc.osc_prepared import OscPreparedMessage
+from osc.osc_bundle_builder import OscBundleWriter
+from compact_decoder import SensorNames
+
+def emit_address(address: str) -> str:
+    """ Address of the (board, sensor, value) messages re-emitting a stream """
+    if address.startswith('/block/'):
+        return '/sensor/' + address[len('/block/'):]
+    return address
+
+def is_index(value) -> bool:
+    """ Whether a board id or sensor index can be re-emitted (32-bit integer) """
+    return isinstance(value, int) and not isinstance(value, bool) and -0x80000000 <= value <= 0x7FFFFFFF
+
+class StreamState:
+    """
+    Latest value, rate and last-seen time of one (board, sensor) stream.
+    """
+    __slots__ = ('address', 'value', 'count', 'rate', 'last_seen', 'changed', 'msg')
+
+    def __init__(self, address: str):
+        # Address of the re-emitted values
+        self.address = emit_address(address)
+        self.value = 0.
+        self.count = 0
+        self.rate = 0.
+        self.last_seen = 0.
+        self.changed = False
+        self.msg = None
+
+    def update(self, value, now: float, n: int = 1):
+        """ Account for n new values (the last one being value) """
+        if self.count:
+            elapsed = now - self.last_seen
+            if elapsed > 0:
+                # Exponential average of the value rate
+                self.rate += (n / elapsed - self.rate) * min(1., elapsed)
+        self.value = value
+        self.count += n
+        self.last_seen = now
+        self.changed = True
+
+class IngestServer:
+    """
+    Table of the board streams, fed from a batched UDP reader.
+
+    Example :
+    >>> server = IngestServer(port = 2324)
+    >>> server.select("/sensor/light")
+    >>> asyncio.run(server.serve(max_port = 2325, emit_rate = 100))
+    """
+
+    def __init__(self,
+            host: str = '0.0.0.0',
+            port: int = 2324,
+            batch: int = 256,
+            buffer_size: int = 65536):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.batch = batch
+        self.buffer = bytearray(buffer_size)
+        self.table = {}
+        self.selection = []
+        self.names = SensorNames()
+        self.now = time.monotonic()
+        self.dispatcher = Dispatcher()
+        self.dispatcher.map(COMPACT_ADDRESS, self.on_compact)
+        self.dispatcher.set_default_handler(self.on_message)
+        # Statistics
+        self.datagrams = 0
+        self.messages = 0
+        self.errors = 0
+        self.batches = 0
+
+    def select(self, selector: str):
+        """ Re-emit the streams of an address (/sensor/light) or a board:sensor pair (3:0) """
+        if ':' in selector:
+            board, sensor = selector.split(':')
+            self.selection.append((int(board), int(sensor)))
+        else:
+            self.selection.append(selector)
+
+    def selected(self, key, state: StreamState) -> bool:
+        if not self.selection:
+            return True
+        return key[1:] in self.selection or key[0] in self.selection or state.address in self.selection
+
+    def stream(self, address: str, board: int, sensor: int) -> StreamState:
+        """ State of a stream (the sensor index is the axis of list values) """
+        key = (address, board, sensor)
+        state = self.table.get(key)
+        if state is None:
+            state = StreamState(address)
+            self.table[key] = state
+        return state
+
+    def on_message(self, address: str, *params):
+        """ Values (/sensor/<name> board, sensor, value), blocks (/block/<name>) and sensor lists (/connect) """
+        self.messages += 1
+        if address == "/connect":
+            self.names.message(address, params)
+        elif address.startswith('/sensor/'):
+            if (len(params) != 3 or not is_index(params[0]) or not is_index(params[1])
+                    or isinstance(params[2], bool) or not isinstance(params[2], (int, float))):
+                self.errors += 1
+                return
+            self.stream(address, params[0], params[1]).update(float(params[2]), self.now)
+        elif address.startswith('/block/'):
+            try:
+                board, sensor, rate, first, samples = decode_block(params)
+            except (ValueError, TypeError, struct.error):
+                self.errors += 1
+                return
+            if not is_index(board) or not is_index(sensor):
+                self.errors += 1
+                return
+            if samples:
+                self.stream(address, board, sensor).update(float(samples[-1]), self.now, len(samples))
+
+    def on_compact(self, address: str, *params):
+        """ Compact values (/c words) """
+        self.messages += 1
+        if not all([is_index(word) for word in params]):
+            self.errors += 1
+            return
+        for board, field, value in decode_compact(params):
+            name, sensor = self.names.resolve(board, field)
+            self.stream(name, board, sensor).update(value, self.now)
+
+    def drain(self):
+        """ Read and decode pending datagrams (at most batch per call) """
+        self.now = time.monotonic()
+        self.batches += 1
+        for _ in range(self.batch):
+            try:
+                length, _ = self.sock.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.datagrams += 1
+            try:
+                self.dispatcher.dispatch_dgram(self.buffer, 0, length)
+            except (ParseError, ValueError, IndexError, TypeError, struct.error):
+                self.errors += 1
+
+    def emit(self, writer: OscBundleWriter, transport):
+        """ Send the changed selected streams to Max (bundles of at most writer.max_size) """
+        for key, state in self.table.items():
+            if not state.changed or not self.selected(key, state):
+                continue
+            state.changed = False
+            try:
+                if state.msg is None:
+                    state.msg = OscPreparedMessage(state.address, "iif")
+                dgram = state.msg.pack(key[1], key[2], state.value)
+            except (BuildError, struct.error, TypeError, ValueError, OverflowError):
+                self.errors += 1
+                continue
+            if not writer.add(dgram):
+                transport.sendto(bytes(writer.dgram))
+                writer.reset()
+                writer.add(dgram)
+        if writer.num_contents:
+            transport.sendto(bytes(writer.dgram))
+            writer.reset()
+
+    def report(self) -> str:
+        lines = ["%d datagrams, %d messages, %d errors, %d streams" % (
+            self.datagrams, self.messages, self.errors, len(self.table))]
+        now = time.monotonic()
+        for (address, board, sensor), state in sorted(self.table.items(), key = lambda item: (item[0][1], item[0][2], item[0][0])):
+            lines.append("  board %3d sensor %2d %-20s value %8.4f | %7.1f Hz | seen %.2f s ago" % (
+                board, sensor, address, state.value, state.rate, now - state.last_seen))
+        return "\n".join(lines)
+
+    async def serve(self,
+            max_host: str = '127.0.0.1',
+            max_port: int = 2325,
+            emit_rate: float = 100.,
+            max_size: int = 1400,
+            report_interval: float = 0.,
+            duration: float = 0.):
+        """ Ingest until cancelled (or for duration seconds), emitting to Max """
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.sock.fileno(), self.drain)
+        transport = None
+        if max_port:
+            transport, _ = await loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr = (max_host, max_port))
+        writer = OscBundleWriter(max_size)
+        start = last_report = loop.time()
+        try:
+            while not duration or loop.time() - start < duration:
+                await asyncio.sleep(1. / emit_rate if emit_rate else 1.)
+                if transport is not None and emit_rate:
+                    self.emit(writer, transport)
+                if report_interval and loop.time() - last_report >= report_interval:
+                    last_report = loop.time()
+                    print(self.report())
+        finally:
+            loop.remove_reader(self.sock.fileno())
+            if transport is not None:
+                transport.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Ingest server of the board traffic')
+    parser.add_argument('--port', type = int, default = 2324, help = 'Port the boards send to')
+    parser.add_argument('--max_host', type = str, default = '127.0.0.1')
+    parser.add_argument('--max_port', type = int, default = 2325, help = 'Port of Max (0 for none)')
+    parser.add_argument('--emit_rate', type = float, default = 100., help = 'Emissions to Max per second')
+    parser.add_argument('--select', type = str, action = 'append', default = [],
+        help = 'Stream to re-emit: address or board:sensor (all by default)')
+    parser.add_argument('--report', type = float, default = 2., help = 'Report interval in seconds')
+    args = parser.parse_args()
+    server = IngestServer(port = args.port)
+    for selector in args.select:
+        server.select(selector)
+    asyncio.run(server.serve(args.max_host, args.max_port, args.emit_rate, report_interval = args.report))
@@ -0,0 +1,182 @@
+"""
+
+ ~ Host // Python 3 ~
+ loadgen.py : Virtual boards for host and hotspot capacity benchmarks
+
+ Simulates N boards with the OSC client of the boards: each one sends the
+ /connect handshake, keeps alive with binary heartbeats on the hotspot port
+ and streams /sensor/<name> (board id, sensor index, value) messages at a
+ given rate for a given sensor mix. Reports the achieved send rate, the CPU
+ use and the dropped sends (send errors and queue drops), and with --sink
+ the datagrams actually received on loopback.
+
+ Usage : python loadgen.py --boards 20 --rate 200 --sensors light:2,rotary:1
+         python loadgen.py --boards 50 --bundle 1400 --sink
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import math
+import time
+import socket
+import argparse
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from udp import OSCClient
+from heartbeat import Heartbeat
+
+def parse_mix(mix: str) -> list:
+    """ Sensor names from a mix description (e.g. 'light:2,rotary:1') """
+    sensors = []
+    for item in mix.split(','):
+        name, _, count = item.partition(':')
+        sensors += [name] * int(count or 1)
+    return sensors
+
+class VirtualBoard:
+    """
+    One simulated board (OSC client, heartbeat and sensors).
+    """
+
+    def __init__(self,
+            b_id: int,
+            sensors: list,
+            host: str = '127.0.0.1',
+            port: int = 2324,
+            hotspot: str = '127.0.0.1',
+            hotspot_port: int = 16841,
+            bundle_size: int = 0,
+            queue_slots: int = 0,
+            heartbeat_ms: int = 1000):
+        self.b_id = b_id
+        self.sensors = sensors
+        self.client = OSCClient(host, port, bundle_size = bundle_size, queue_slots = queue_slots, seq = bundle_size > 0, b_id = b_id)
+        self.heartbeat = Heartbeat(b_id, hotspot, hotspot_port, heartbeat_ms) if hotspot_port else None
+        self.msgs = [self.client.prepare("/sensor/" + name, "iif") for name in sensors]
+        self.phase = b_id * 0.37
+        self.messages = 0
+
+    def connect(self):
+        """ Connection handshake """
+        sensors_list = " ".join(["%d:%s" % (i, name) for i, name in enumerate(self.sensors)])
+        self.client.send_typed("/connect", "iss", self.b_id, "virtual", sensors_list)
+        self.client.flush()
+        if self.heartbeat is not None:
+            self.heartbeat.send()
+
+    def step(self, t: float):
+        """ Send one value of each sensor (and a heartbeat if due) """
+        for i, msg in enumerate(self.msgs):
+            value = 0.5 + 0.5 * math.sin(2 * math.pi * (0.5 + 0.1 * i) * t + self.phase)
+            self.client.send_prepared(msg, self.b_id, i, value)
+        self.messages += len(self.msgs)
+        self.client.flush()
+        self.client.pump()
+        if self.heartbeat is not None:
+            self.heartbeat.tick()
+
+    def dropped(self) -> int:
+        _, errors, drops, _ = self.client.stats()
+        heartbeat_errors = self.heartbeat.errors if self.heartbeat is not None else 0
+        return errors + drops + heartbeat_errors
+
+    def datagrams(self) -> int:
+        return self.client.stats()[0] + (self.heartbeat.sent if self.heartbeat is not None else 0)
+
+class Sink:
+    """
+    Receiver counting the datagrams of the boards (loopback runs).
+    """
+
+    def __init__(self, port: int):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.sock.bind(('127.0.0.1', port))
+        self.sock.settimeout(0.5)
+        self.received = 0
+        self.running = True
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            try:
+                self.sock.recvfrom(65536)
+                self.received += 1
+            except socket.timeout:
+                pass
+
+def run(args):
+    sensors = parse_mix(args.sensors)
+    sinks = []
+    if args.sink:
+        sinks.append(Sink(args.port))
+        if args.hotspot_port:
+            sinks.append(Sink(args.hotspot_port))
+    boards = [VirtualBoard(args.first_id + b, sensors, args.host, args.port,
+                args.hotspot, args.hotspot_port, args.bundle, args.queue, args.heartbeat)
+              for b in range(args.boards)]
+    for board in boards:
+        board.connect()
+    period = 1. / args.rate
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    next_step = start
+    last_report = start
+    late = 0
+    while True:
+        now = time.perf_counter()
+        if now - start >= args.duration:
+            break
+        if now < next_step:
+            time.sleep(next_step - now)
+            continue
+        for board in boards:
+            board.step(now - start)
+        next_step += period
+        if time.perf_counter() > next_step:
+            # Cannot keep up with the rate, skip the missed steps
+            late += 1
+            next_step = time.perf_counter()
+        if now - last_report >= args.interval:
+            last_report = now
+            report(boards, sinks, now - start, time.process_time() - cpu_start, late)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)
+    print("=" * 40)
+    report(boards, sinks, elapsed, time.process_time() - cpu_start, late)
+    for sink in sinks:
+        sink.running = False
+
+def report(boards: list, sinks: list, elapsed: float, cpu: float, late: int):
+    messages = sum([b.messages for b in boards])
+    datagrams = sum([b.datagrams() for b in boards])
+    dropped = sum([b.dropped() for b in boards])
+    line = "%5.1f s | %d boards | %9.1f msg/s %8.1f dgram/s | dropped %d | CPU %5.1f%% | late steps %d" % (
+        elapsed, len(boards), messages / elapsed, datagrams / elapsed, dropped, 100. * cpu / elapsed, late)
+    if sinks:
+        received = sum([s.received for s in sinks])
+        line += " | received %d (%.2f%% lost)" % (received, 100. * (1 - received / datagrams) if datagrams else 0.)
+    print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Virtual boards load generator')
+    parser.add_argument('--boards', type = int, default = 10, help = 'Number of virtual boards')
+    parser.add_argument('--first_id', type = int, default = 0, help = 'Id of the first board')
+    parser.add_argument('--sensors', type = str, default = 'light:1', help = 'Sensor mix of each board (name:count,...)')
+    parser.add_argument('--rate', type = float, default = 200., help = 'Sensor reads per second of each board')
+    parser.add_argument('--duration', type = float, default = 10., help = 'Duration of the run in seconds')
+    parser.add_argument('--host', type = str, default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 2324, help = 'OSC port (Max udpreceive)')
+    parser.add_argument('--hotspot', type = str, default = '127.0.0.1')
+    parser.add_argument('--hotspot_port', type = int, default = 16841, help = 'Heartbeat port (0 for none)')
+    parser.add_argument('--heartbeat', type = int, default = 1000, help = 'Heartbeat interval in ms')
+    parser.add_argument('--bundle', type = int, default = 0, help = 'Bundle size (0 to send each message)')
+    parser.add_argument('--queue', type = int, default = 0, help = 'Send queue slots (0 to send directly)')
+    parser.add_argument('--interval', type = float, default = 2., help = 'Report interval in seconds')
+    parser.add_argument('--sink', action = 'store_true', help = 'Receive and count the datagrams (loopback)')
+    run(parser.parse_args())
@@ -0,0 +1,215 @@
+"""
+
+ ~ Host // Python 3 ~
+ monitor.py : Telemetry of the OSC stream of the boards
+
+ Tee placed in front of Max: listens on the port the boards send to,
+ forwards every datagram untouched to Max, and reports for each board the
+ loss rate and reordering (from the /seq element of the bundles, or the
+ /seq message following each batch of values without bundles), the
+ inter-arrival jitter (RFC 3550 estimator, on the transit time when the
+ bundles carry synchronised timetags), the latency (synchronised timetags
+ only) and the throughput. The /stats reports of the boards (send errors,
+ queue drops, values suppressed by the send policies) are shown as well.
+ Packets are attributed to the board id carried by their messages, and the
+ bundles of the hotspot relay (one nested bundle per board datagram) are
+ walked recursively, so that the boards behind a relay are told apart.
+
+ Usage : python monitor.py [--port 2324] [--forward 2325] [--interval 2]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc import ntp
+from osc.osc_bundle import OscBundle
+from osc.osc_compact import COMPACT_ADDRESS, decode_word
+from osc.osc_view import parse_message
+from osc.osc_message import ParseError
+
+class BoardStats:
+    """
+    Counters of the stream of one board.
+    """
+
+    def __init__(self, b_id: int):
+        self.b_id = b_id
+        self.expected = None
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.jitter = 0.
+        self.period = 0.
+        self.last_transit = None
+        self.last_arrival = None
+        self.latency = 0.
+        self.latency_n = 0
+        self.bytes = 0
+        self.datagrams = 0
+        self.messages = 0
+        self.stats = None
+
+    def sequence(self, seq: int):
+        """ Account for a received sequence number """
+        self.received += 1
+        if self.expected is None or seq == self.expected:
+            self.expected = seq + 1
+        elif seq > self.expected:
+            self.lost += seq - self.expected
+            self.expected = seq + 1
+        else:
+            # Late (counted as lost when the gap was seen) or duplicate
+            self.reordered += 1
+            if self.lost > 0:
+                self.lost -= 1
+            else:
+                self.duplicates += 1
+
+    def arrival(self, now: float, sent: float = None):
+        """ Update the jitter (and latency if the send time is known) """
+        if sent is not None:
+            # Variations of the transit time (synchronised timetags)
+            transit = now - sent
+            if self.last_transit is not None:
+                self.jitter += (abs(transit - self.last_transit) - self.jitter) / 16
+            self.last_transit = transit
+            self.latency += transit
+            self.latency_n += 1
+        else:
+            # Variations of the inter-arrival time around its mean
+            if self.last_arrival is not None:
+                interval = now - self.last_arrival
+                self.jitter += (abs(interval - self.period) - self.jitter) / 16
+                self.period += (interval - self.period) / 16
+        self.last_arrival = now
+
+    def report(self, elapsed: float) -> str:
+        total = self.received + self.lost
+        loss = 100. * self.lost / total if total else 0.
+        line = "board %3d | %7.1f dgram/s %7.1f msg/s %8.1f kB/s | loss %5.2f%% (%d) reorder %d dup %d | jitter %6.2f ms" % (
+            self.b_id, self.datagrams / elapsed, self.messages / elapsed, self.bytes / elapsed / 1000,
+            loss, self.lost, self.reordered, self.duplicates, self.jitter * 1000)
+        if self.latency_n:
+            line += " | latency %6.2f ms" % (self.latency / self.latency_n * 1000)
+        if self.stats is not None:
+            line += " | board sent %d errors %d drops %d retries %d suppressed %d" % self.stats
+        return line
+
+    def reset_rates(self):
+        self.bytes = 0
+        self.datagrams = 0
+        self.messages = 0
+        self.latency = 0.
+        self.latency_n = 0
+
+class Monitor:
+    """
+    Forwards the traffic of the boards to Max and measures it.
+    """
+
+    def __init__(self,
+            host: str = '0.0.0.0',
+            port: int = 2324,
+            forward_host: str = '127.0.0.1',
+            forward_port: int = 2325):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.forward = (forward_host, forward_port) if forward_port else None
+        self.boards = {}
+
+    def board(self, b_id: int) -> BoardStats:
+        if b_id not in self.boards:
+            self.boards[b_id] = BoardStats(b_id)
+        return self.boards[b_id]
+
+    def message(self, dgram) -> BoardStats:
+        """ Account for one message, returns the stats of its board (None if unknown) """
+        try:
+            address, params = parse_message(dgram)
+        except ParseError:
+            return None
+        if not params or not isinstance(params[0], int) or isinstance(params[0], bool):
+            return None
+        # The messages of the boards start with their id (held by the words of /c)
+        b_id = decode_word(params[0])[0] if address == COMPACT_ADDRESS else params[0]
+        stats = self.board(b_id)
+        if address == "/seq" and len(params) == 2 and isinstance(params[1], int):
+            stats.sequence(params[1])
+        elif address == "/stats" and len(params) in (6, 7):
+            stats.stats = tuple(params[2:]) + (0,) * (7 - len(params))
+        stats.messages += 1
+        return stats
+
+    def packet(self, dgram, now: float, sent: float = None):
+        """ Account for a message or bundle, recursing into nested (relayed) bundles """
+        boards = {}
+        nested = False
+        if OscBundle.dgram_is_bundle(dgram):
+            try:
+                bundle = OscBundle(dgram)
+            except Exception:
+                return
+            if bundle.timetag != ntp.TIMETAG_IMMEDIATELY:
+                sent = ntp.timetag_to_system_time(bundle.timetag)
+            for content in bundle:
+                if isinstance(content, OscBundle):
+                    nested = True
+                    self.packet(content.dgram, now, sent)
+                    continue
+                stats = self.message(content.dgram)
+                if stats is not None:
+                    boards[stats] = boards.get(stats, 0) + len(content.dgram)
+        else:
+            stats = self.message(dgram)
+            if stats is not None:
+                boards[stats] = 0
+        if len(boards) == 1 and not nested:
+            # Datagram of a single board (bundle header included)
+            boards = {stats: len(dgram) for stats in boards}
+        # Each board with messages in the packet received one datagram
+        for stats, size in boards.items():
+            stats.datagrams += 1
+            stats.bytes += size
+            stats.arrival(now, sent)
+
+    def handle(self, dgram: bytes, client, now: float):
+        """ Account for one datagram """
+        if self.forward is not None:
+            self.sock.sendto(dgram, self.forward)
+        self.packet(dgram, now)
+
+    def serve_forever(self, interval: float = 2.):
+        last = time.time()
+        self.sock.settimeout(interval)
+        while True:
+            try:
+                dgram, client = self.sock.recvfrom(65536)
+                self.handle(dgram, client, time.time())
+            except socket.timeout:
+                pass
+            now = time.time()
+            if now - last >= interval:
+                for b_id in sorted(self.boards):
+                    print(self.boards[b_id].report(now - last))
+                    self.boards[b_id].reset_rates()
+                if self.boards:
+                    print("-" * 40)
+                last = now
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Telemetry of the OSC stream of the boards')
+    parser.add_argument('--port', type = int, default = 2324, help = 'Port the boards send to')
+    parser.add_argument('--forward_host', type = str, default = '127.0.0.1')
+    parser.add_argument('--forward', type = int, default = 2325, help = 'Port of Max (0 to only monitor)')
+    parser.add_argument('--interval', type = float, default = 2., help = 'Report interval in seconds')
+    args = parser.parse_args()
+    Monitor(port = args.port, forward_host = args.forward_host, forward_port = args.forward).serve_forever(args.interval)
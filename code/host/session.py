@@ -0,0 +1,344 @@
+"""
+
+ ~ Host // Python 3 ~
+ session.py : Record and replay of the OSC sessions of the boards
+
+ The recorder listens on the port the boards send to (optionally forwarding
+ every datagram to Max) and appends the raw datagrams to a binary log, each
+ one prefixed by a fixed record header:
+
+    file header   : magic 'OSCLOG1\\0' (8) | start time in us (uint64)
+    record header : length (uint32) | receive time in us (uint64) |
+                    source ip (4) | source port (uint16) | padding (2)
+    record data   : the datagram (length bytes)
+
+ The log is append-only (a record cut by a crash is ignored on read) and is
+ read through mmap: the index of a session is built by hopping from header
+ to header, without loading the datagrams. The replayer re-sends the records
+ to a target at the recorded pace, accelerated (--speed 4) or as fast as
+ possible (--speed 0), from a given time in the session, and can keep only
+ some addresses (prefixes) and board ids.
+
+ Usage : python session.py record rehearsal.osclog [--port 2324] [--forward 2325]
+         python session.py replay rehearsal.osclog [--port 2325] [--speed 1]
+                                  [--address /sensor/light] [--board 3] [--start 60]
+         python session.py info rehearsal.osclog
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import mmap
+import time
+import socket
+import struct
+import argparse
+from array import array
+from bisect import bisect_left
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc import ntp
+from osc.osc_bundle import OscBundle
+from osc.osc_view import parse_message
+from osc.osc_message import ParseError
+from osc.osc_compact import COMPACT_ADDRESS, decode_word
+from osc.osc_bundle_builder import OscBundleWriter
+
+MAGIC = b'OSCLOG1\x00'
+FILE_HEADER = struct.Struct('<8sQ')
+RECORD_HEADER = struct.Struct('<IQ4sH2x')
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+class SessionWriter:
+    """
+    Append-only log of received datagrams.
+
+    Example :
+    >>> log = SessionWriter("rehearsal.osclog")
+    >>> log.write(dgram, ('192.168.4.2', 2324))
+    >>> log.close()
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.):
+        exists = os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size
+        self.file = open(path, 'ab')
+        if not exists:
+            self.file.write(FILE_HEADER.pack(MAGIC, now_us()))
+        self.header = bytearray(RECORD_HEADER.size)
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, dgram, client, stamp: int = None):
+        """ Append one datagram received from client (ip, port) """
+        RECORD_HEADER.pack_into(self.header, 0, len(dgram), stamp or now_us(),
+                                socket.inet_aton(client[0]), client[1])
+        self.file.write(self.header)
+        self.file.write(dgram)
+        self.records += 1
+        self.bytes += len(dgram)
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.file.close()
+
+class SessionReader:
+    """
+    Memory-mapped log, indexed by receive time.
+
+    Example :
+    >>> log = SessionReader("rehearsal.osclog")
+    >>> for stamp, client, dgram in log.records(log.seek(60.)):
+    ...     print(stamp, client, len(dgram))
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, self.start = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a session log: ' + path)
+        # Offsets and receive times of the records
+        self.offsets = array('Q')
+        self.stamps = array('Q')
+        offset = FILE_HEADER.size
+        size = len(self.map)
+        while offset + RECORD_HEADER.size <= size:
+            length, stamp, _, _ = RECORD_HEADER.unpack_from(self.map, offset)
+            if offset + RECORD_HEADER.size + length > size:
+                # Record cut by the end of the recording
+                break
+            self.offsets.append(offset)
+            self.stamps.append(stamp)
+            offset += RECORD_HEADER.size + length
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def duration(self) -> float:
+        """ Seconds between the start of the recording and the last record """
+        return (self.stamps[-1] - self.start) / 1e6 if self.stamps else 0.
+
+    def seek(self, seconds: float) -> int:
+        """ Index of the first record received after seconds in the session """
+        return bisect_left(self.stamps, self.start + int(seconds * 1e6))
+
+    def record(self, index: int):
+        """ Receive time (us), source (ip, port) and datagram of a record """
+        offset = self.offsets[index]
+        length, stamp, ip, port = RECORD_HEADER.unpack_from(self.map, offset)
+        start = offset + RECORD_HEADER.size
+        return stamp, (socket.inet_ntoa(ip), port), self.map[start:start + length]
+
+    def records(self, first: int = 0, last: int = None):
+        for index in range(first, len(self) if last is None else last):
+            yield self.record(index)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+def message_board(address: str, params) -> int:
+    """ Board id of a message (first integer argument, board field of compact words) """
+    if not params or not isinstance(params[0], int):
+        return None
+    if address == COMPACT_ADDRESS:
+        return decode_word(params[0])[0]
+    return params[0]
+
+def build_bundle(timetag: int, elements: list) -> bytes:
+    """ Bundle datagram of the given timetag and element datagrams """
+    parts = [b'#bundle\x00', struct.pack('>Q', timetag)]
+    for element in elements:
+        parts.append(struct.pack('>I', len(element)))
+        parts.append(bytes(element))
+    return b''.join(parts)
+
+class SessionFilter:
+    """
+    Keeps the messages of some addresses (prefixes) and board ids.
+    """
+
+    def __init__(self, addresses: list = None, boards: list = None, max_size: int = 1400):
+        self.addresses = tuple(addresses or ())
+        self.boards = set(boards or ())
+        self.writer = OscBundleWriter(max_size)
+
+    def match(self, dgram) -> bool:
+        """ Whether a single message passes the filter """
+        try:
+            address, params = parse_message(dgram)
+        except (ParseError, ValueError, IndexError):
+            return False
+        if self.addresses and not address.startswith(self.addresses):
+            return False
+        if self.boards and message_board(address, params) not in self.boards:
+            return False
+        return True
+
+    def elements(self, bundle: OscBundle) -> list:
+        """ Datagrams of the matching elements of a bundle (nested bundles filtered in place) """
+        kept = []
+        for content in bundle:
+            if isinstance(content, OscBundle):
+                nested = self.elements(content)
+                if nested:
+                    kept.append(build_bundle(content.timetag, nested))
+            elif self.match(content.dgram):
+                kept.append(content.dgram)
+        return kept
+
+    def apply(self, dgram: bytes) -> list:
+        """ The datagrams restricted to the matching messages (none if none matches)
+
+        The kept elements of a bundle are sent in bundles of at most max_size
+        bytes (with its timetag), an element larger than that on its own.
+        """
+        if not self.addresses and not self.boards:
+            return [dgram]
+        if not OscBundle.dgram_is_bundle(dgram):
+            return [dgram] if self.match(dgram) else []
+        try:
+            bundle = OscBundle(dgram)
+            kept = self.elements(bundle)
+        except Exception:
+            return []
+        dgrams = []
+        self.writer.reset(bundle.timetag)
+        for element in kept:
+            if self.writer.add(element):
+                continue
+            if self.writer.num_contents:
+                dgrams.append(bytes(self.writer.dgram))
+                self.writer.reset(bundle.timetag)
+            if not self.writer.add(element):
+                dgrams.append(build_bundle(bundle.timetag, [element]))
+        if self.writer.num_contents:
+            dgrams.append(bytes(self.writer.dgram))
+        return dgrams
+
+def record(path: str,
+        host: str = '0.0.0.0',
+        port: int = 2324,
+        forward_host: str = '127.0.0.1',
+        forward_port: int = 0,
+        duration: float = 0.):
+    """ Record the datagrams received on port (until interrupted or for duration seconds) """
+    log = SessionWriter(path)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    sock.bind((host, port))
+    sock.settimeout(0.5)
+    forward = (forward_host, forward_port) if forward_port else None
+    buffer = bytearray(65536)
+    view = memoryview(buffer)
+    start = time.monotonic()
+    try:
+        while not duration or time.monotonic() - start < duration:
+            try:
+                length, client = sock.recvfrom_into(buffer)
+            except socket.timeout:
+                continue
+            log.write(view[:length], client)
+            if forward is not None:
+                sock.sendto(view[:length], forward)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.close()
+        sock.close()
+    print("%d datagrams (%d bytes) recorded in %s" % (log.records, log.bytes, path))
+
+def replay(path: str,
+        host: str = '127.0.0.1',
+        port: int = 2325,
+        speed: float = 1.,
+        start: float = 0.,
+        end: float = 0.,
+        addresses: list = None,
+        boards: list = None,
+        retime: bool = False):
+    """ Re-send a session to (host, port), speed times faster (0 for as fast as possible) """
+    log = SessionReader(path)
+    first = log.seek(start)
+    last = log.seek(end) if end else len(log)
+    session_filter = SessionFilter(addresses, boards)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    dest = (host, port)
+    sent = 0
+    t0 = None
+    clock = time.perf_counter()
+    try:
+        for stamp, _, dgram in log.records(first, last):
+            if speed:
+                if t0 is None:
+                    t0 = stamp
+                delay = (stamp - t0) / 1e6 / speed - (time.perf_counter() - clock)
+                if delay > 0:
+                    time.sleep(delay)
+            for dgram in session_filter.apply(dgram):
+                if retime and OscBundle.dgram_is_bundle(dgram):
+                    # Recorded timetags refer to the time of the recording
+                    dgram = bytearray(dgram)
+                    dgram[8:16] = ntp.IMMEDIATELY
+                sock.sendto(dgram, dest)
+                sent += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+    elapsed = time.perf_counter() - clock
+    print("%d datagrams sent for %d recorded in %.2f s" % (sent, last - first, elapsed))
+    log.close()
+
+def info(path: str):
+    log = SessionReader(path)
+    sources = {}
+    for _, client, _ in log.records():
+        sources[client[0]] = sources.get(client[0], 0) + 1
+    print("%s : %d datagrams over %.2f s" % (path, len(log), log.duration))
+    for ip, count in sorted(sources.items()):
+        print("  %-15s %d datagrams" % (ip, count))
+    log.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Record and replay of the OSC sessions of the boards')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    rec = commands.add_parser('record', help = 'Record the datagrams sent by the boards')
+    rec.add_argument('path', type = str)
+    rec.add_argument('--port', type = int, default = 2324, help = 'Port the boards send to')
+    rec.add_argument('--forward_host', type = str, default = '127.0.0.1')
+    rec.add_argument('--forward', type = int, default = 0, help = 'Port of Max (0 to only record)')
+    rec.add_argument('--duration', type = float, default = 0., help = 'Duration in seconds (0 until interrupted)')
+    rep = commands.add_parser('replay', help = 'Re-send a recorded session')
+    rep.add_argument('path', type = str)
+    rep.add_argument('--host', type = str, default = '127.0.0.1')
+    rep.add_argument('--port', type = int, default = 2325, help = 'Target port')
+    rep.add_argument('--speed', type = float, default = 1., help = 'Replay speed (0 for as fast as possible)')
+    rep.add_argument('--start', type = float, default = 0., help = 'Start time in the session (s)')
+    rep.add_argument('--end', type = float, default = 0., help = 'End time in the session (s, 0 for the end)')
+    rep.add_argument('--address', type = str, action = 'append', default = [], help = 'Address prefix to keep')
+    rep.add_argument('--board', type = int, action = 'append', default = [], help = 'Board id to keep')
+    rep.add_argument('--retime', action = 'store_true', help = 'Send the bundles for immediate execution')
+    inf = commands.add_parser('info', help = 'Summary of a recorded session')
+    inf.add_argument('path', type = str)
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args.path, port = args.port, forward_host = args.forward_host,
+               forward_port = args.forward, duration = args.duration)
+    elif args.command == 'replay':
+        replay(args.path, args.host, args.port, args.speed, args.start, args.end,
+               args.address, args.board, args.retime)
+    else:
+        info(args.path)
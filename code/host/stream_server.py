@@ -0,0 +1,120 @@
+"""
+
+ ~ Host // Python 3 ~
+ stream_server.py : Stand-in server of the reliable control messages
+
+ Accepts the TCP connections of the boards (stream_port of their osc
+ config) and decodes their SLIP-framed OSC messages (OSC 1.1). Messages
+ are printed and forwarded as UDP datagrams to Max, and messages can be
+ sent back to a board (identified by its /connect message) on its
+ connection. The sensor values keep flowing over UDP.
+
+ Usage : python stream_server.py [--port 2326] [--forward 2324]
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import os
+import sys
+import socket
+import asyncio
+import argparse
+from collections import deque
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensors'))
+from osc.osc_slip import SlipDecoder, encode
+from osc.osc_view import parse_message
+from osc.osc_message import ParseError
+from osc.osc_prepared import OscTypedEncoder
+
+class StreamServer:
+    """
+    TCP server of the control messages of the boards.
+
+    Example :
+    >>> server = StreamServer(port = 2326, forward_port = 2324)
+    >>> asyncio.run(server.serve())
+    """
+
+    def __init__(self,
+            host: str = '0.0.0.0',
+            port: int = 2326,
+            forward_host: str = '127.0.0.1',
+            forward_port: int = 0,
+            verbose: bool = True,
+            history: int = 256):
+        self.host = host
+        self.port = port
+        self.forward = (forward_host, forward_port) if forward_port else None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.verbose = verbose
+        # Connection of each board (by id), and last messages received
+        self.boards = {}
+        self.received = deque((), history)
+        self.connections = 0
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Decode the frames of one connection until it is closed """
+        peer = writer.get_extra_info('peername')
+        decoder = SlipDecoder()
+        self.connections += 1
+        b_id = None
+        if self.verbose:
+            print("Connection from %s:%d" % peer)
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for dgram in decoder.feed(data):
+                    try:
+                        address, params = parse_message(dgram)
+                    except (ParseError, ValueError, IndexError):
+                        continue
+                    if address == "/connect" and params and isinstance(params[0], int):
+                        b_id = params[0]
+                        self.boards[b_id] = writer
+                    self.received.append((b_id, address, params))
+                    if self.verbose:
+                        print("%s board %s : %s %s" % (peer[0], b_id, address, list(params)))
+                    if self.forward is not None:
+                        self.sock.sendto(dgram, self.forward)
+        except ConnectionError:
+            pass
+        finally:
+            if b_id is not None and self.boards.get(b_id) is writer:
+                del self.boards[b_id]
+            writer.close()
+            if self.verbose:
+                print("Connection of %s:%d closed" % peer)
+
+    def send(self, b_id: int, address: str, typetag: str, *values) -> bool:
+        """ Send a message to a connected board """
+        writer = self.boards.get(b_id)
+        if writer is None:
+            return False
+        writer.write(encode(OscTypedEncoder(address, typetag).pack(*values)))
+        return True
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+    async def serve(self):
+        """ Serve until cancelled """
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Stand-in server of the reliable control messages')
+    parser.add_argument('--port', type = int, default = 2326, help = 'TCP port of the boards (stream_port)')
+    parser.add_argument('--forward_host', type = str, default = '127.0.0.1')
+    parser.add_argument('--forward', type = int, default = 2324, help = 'Port of Max (0 to only print)')
+    args = parser.parse_args()
+    server = StreamServer(port = args.port, forward_host = args.forward_host, forward_port = args.forward)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
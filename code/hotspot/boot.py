@@ -13,11 +13,13 @@
 import gc
 import esp
 import json
-import time
 import socket
 import network
 import select
 from wifi import WiFi
+from heartbeat import parse_heartbeat
+from registry import Registry
+from relay import OSCRelay, is_osc
 from buzzer import import_buzzer
 from screen import import_screen
 from boards import ESP32C3, ESP32S3, board_dict
@@ -34,6 +36,7 @@ b_name = "~ Hotspot v0.2 ~" # Board identifier
 b_status = "Booting ..."	# Status print
 read_timeout = 1000			# Time between read
 alive_timeout = 10000 		# Time before considering device dead
+max_batch = 32				# Maximum messages handled per wake-up
 # Select one meta-config
 config = "esp32c3_expansion"
 # Import corresponding JSON file from flash
@@ -47,16 +50,13 @@ with open("configs/wifi.json") as f:
     wifi_config = json.load(f)
 # Select the accurate board
 board = board_dict[config["board"]]()
-# IP of the master (Ableton Live)
-live_ip = ''
-live_lastseen = 0
-# Array of sensor boards that can connect
-boards_array = [0] * 22
-boards_ip = [''] * 22
-boards_lastseen = [0] * 22
+# Registry of the sensor boards (and master, Ableton Live) that can connect
+registry = Registry(
+    capacity = config.get("max_boards", 22),
+    timeout_ms = alive_timeout)
 # Create the screen
 screen = import_screen(config, board)
-screen.hotspot(b_name, 'Creating ...', live_ip, boards_array)
+screen.hotspot(b_name, 'Creating ...', registry.live_ip, registry.boards())
 # Create a buzzer if present
 buzzer = import_buzzer(config, board)
 
@@ -66,54 +66,68 @@ buzzer = import_buzzer(config, board)
 ap = network.WLAN(network.AP_IF)
 ap.active(True)
 ap.config(essid=ssid, password=password, authmode=3)
-screen.hotspot(b_name, 'Activating ...', live_ip, boards_array)
+screen.hotspot(b_name, 'Activating ...', registry.live_ip, registry.boards())
 # Try to activate the hotspot
 while ap.active() == False:
     pass
 print(ap.ifconfig())
 # Create a server socket
-screen.hotspot(b_name, 'Socketing ...', live_ip, boards_array)
+screen.hotspot(b_name, 'Socketing ...', registry.live_ip, registry.boards())
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind(('', 16841))
-# s.listen(5)
-screen.hotspot(b_name, 'Success.', live_ip, boards_array)
+sock.setblocking(False)
+# Single poller for the whole loop
+poller = select.poll()
+poller.register(sock, select.POLLIN)
+# Relay mode: OSC traffic of the boards re-bundled toward live
+relay = None
+relay_config = config.get("relay", {})
+if (relay_config.get("enabled", 0)):
+    relay = OSCRelay(sock,
+        port = relay_config.get("port", 2324),
+        max_size = relay_config.get("max_size", 1400),
+        flush_ms = relay_config.get("flush_ms", 10))
+screen.hotspot(b_name, 'Success.', registry.live_ip, registry.boards())
 # Client accept loop
+screen.hotspot(b_name, 'Ready.', registry.live_ip, registry.boards())
 while True:
-    # Wait for new message
-    screen.hotspot(b_name, 'Ready.', live_ip, boards_array)
-    # Create a timeout
-    poller = select.poll()
-    poller.register(sock, select.POLLIN)
-    # Wait for available data
-    res = poller.poll(read_timeout)
+    # Wait for available data (at most until the next expiry or relay flush)
+    timeout = registry.next_timeout(read_timeout)
+    if (relay is not None):
+        timeout = relay.next_timeout(timeout)
+    poller.poll(timeout)
+    # Read all pending messages (bounded batch)
+    for n in range(max_batch):
+        try:
+            message, client = sock.recvfrom(2048)
+        except OSError:
+            break
+        client = client[0]
+        # Process message (binary heartbeat, or any traffic of a known board)
+        board_id = parse_heartbeat(message)
+        if (board_id < 0):
+            board_id = registry.lookup(client)
+        # Relay the OSC traffic (in order of arrival)
+        if (relay is not None and is_osc(message)):
+            relay.add(message)
+        # Update corresponding status
+        if (board_id >= 0):
+            registry.seen(board_id, client)
+        elif (relay is not None and is_osc(message)):
+            pass
+        elif (message[:4] == b'live'):
+            registry.seen_live(client)
+        else:
+            print(f'Unknown message {message} from {client}')
     # Check for alive status
-    cur_time = time.ticks_ms()
-    if (cur_time - live_lastseen > alive_timeout):
-        live_ip = ''
-    for b in range(len(boards_array)):
-        if (cur_time - boards_lastseen[b] > alive_timeout):
-            boards_array[b] = 0
-            boards_ip[b] = ''
-    # Update screen
-    screen.hotspot(b_name, 'Refreshed.', live_ip, boards_array)
-    if (not res):
-        continue
-    message, client = sock.recvfrom(2048)
-    # Process message
-    message = message.split(b'\x00')[0].decode('utf-8')
-    client = client[0]
-    print(f'Got message {message} from {client}')
-    # Update corresponding status
-    if (message[:4] == 'live'):
-        live_ip = client
-        live_lastseen = time.ticks_ms()
-    else:
-        board_id = int(message)
-        boards_array[board_id] = 1
-        boards_ip[board_id] = client
-        boards_lastseen[board_id] = time.ticks_ms()
-    # Update screen
-    screen.hotspot(b_name, 'Updated.', live_ip, boards_array)
+    registry.expire()
+    # Send the relayed bundle when due
+    if (relay is not None):
+        relay.poll(registry.live_ip)
+    # Update screen (only on changes)
+    if (registry.changed):
+        registry.changed = False
+        screen.hotspot(b_name, f'Ready ({len(registry)}).', registry.live_ip, registry.boards())
     
 
 # Initialize network settings
@@ -0,0 +1,198 @@
+"""Maps OSC addresses to handler functions.
+
+Handlers are registered on plain OSC addresses and compiled into a trie
+(one level per address part). Incoming addresses are matched as OSC 1.0
+address patterns, supporting '?', '*', '[]' (with ranges and '!'
+negation) and '{,}' alternatives. The result of each pattern lookup is
+cached, so that the steady-state cost of dispatching is a dict lookup.
+"""
+
+import struct
+
+from osc import osc_view
+from osc.osc_bundle import _BUNDLE_PREFIX
+
+# Maximum number of pattern lookups kept in cache.
+CACHE_SIZE = 32
+# Characters that turn an address part into a pattern.
+_PATTERN_CHARS = '?*[]{}'
+
+
+def match_part(pattern: str, name: str, pi: int = 0, ni: int = 0) -> bool:
+    """Returns whether an address part matches an OSC pattern part.
+
+    Args:
+      pattern: Part of an OSC address pattern (between two '/').
+      name: Part of a registered OSC address.
+      pi: Current index in the pattern.
+      ni: Current index in the name.
+    """
+    while pi < len(pattern):
+        c = pattern[pi]
+        if c == '*':
+            # Collapse consecutive stars, then try every possible split.
+            while pi < len(pattern) and pattern[pi] == '*':
+                pi += 1
+            if pi == len(pattern):
+                return True
+            for k in range(ni, len(name) + 1):
+                if match_part(pattern, name, pi, k):
+                    return True
+            return False
+        if c == '{':
+            close = pattern.find('}', pi)
+            if close < 0:
+                return False
+            for alt in pattern[pi + 1:close].split(','):
+                if (name[ni:ni + len(alt)] == alt
+                        and match_part(pattern, name, close + 1, ni + len(alt))):
+                    return True
+            return False
+        if ni >= len(name):
+            return False
+        if c == '[':
+            close = pattern.find(']', pi + 1)
+            if close < 0:
+                return False
+            chars = pattern[pi + 1:close]
+            negate = chars.startswith('!')
+            if negate:
+                chars = chars[1:]
+            found = False
+            k = 0
+            while k < len(chars):
+                if k + 2 < len(chars) and chars[k + 1] == '-':
+                    found = chars[k] <= name[ni] <= chars[k + 2]
+                    k += 3
+                else:
+                    found = chars[k] == name[ni]
+                    k += 1
+                if found:
+                    break
+            if found == negate:
+                return False
+            pi = close + 1
+        elif c != '?' and c != name[ni]:
+            return False
+        else:
+            pi += 1
+        ni += 1
+    return ni == len(name)
+
+
+class _Node(object):
+    """Node of the address trie."""
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.handlers = []
+
+
+class Dispatcher(object):
+    """Maps OSC addresses to handlers and dispatches messages to them.
+
+    Handlers are called as handler(address, *params), which is compatible
+    with the osc_parse and osc_attr helpers of udp.py.
+    """
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._default_handler = None
+        self._cache = {}
+
+    def map(self, address: str, handler) -> None:
+        """Map an OSC address to a handler.
+
+        Args:
+          - address: Plain OSC address (e.g. '/board/refresh').
+          - handler: Callable invoked as handler(address, *params).
+        """
+        node = self._root
+        for part in address.split('/')[1:]:
+            child = node.children.get(part)
+            if child is None:
+                child = _Node()
+                node.children[part] = child
+            node = child
+        node.handlers.append(handler)
+        self._cache = {}
+
+    def unmap(self, address: str, handler) -> None:
+        """Remove a handler previously mapped to an OSC address.
+
+        Raises:
+          - ValueError: if the handler was not mapped to this address.
+        """
+        node = self._root
+        for part in address.split('/')[1:]:
+            node = node.children.get(part)
+            if node is None:
+                raise ValueError('Address {} is not mapped'.format(address))
+        node.handlers.remove(handler)
+        self._cache = {}
+
+    def set_default_handler(self, handler) -> None:
+        """Set the handler called for messages matching no address."""
+        self._default_handler = handler
+
+    def _match(self, node: _Node, parts: list, index: int, handlers: list) -> None:
+        if index == len(parts):
+            handlers.extend(node.handlers)
+            return
+        part = parts[index]
+        for c in _PATTERN_CHARS:
+            if c in part:
+                break
+        else:
+            child = node.children.get(part)
+            if child is not None:
+                self._match(child, parts, index + 1, handlers)
+            return
+        for name, child in node.children.items():
+            if match_part(part, name):
+                self._match(child, parts, index + 1, handlers)
+
+    def handlers_for_address(self, pattern: str) -> list:
+        """Returns the handlers matching an OSC address pattern."""
+        handlers = self._cache.get(pattern)
+        if handlers is None:
+            handlers = []
+            if pattern.startswith('/'):
+                self._match(self._root, pattern.split('/')[1:], 0, handlers)
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache = {}
+            self._cache[pattern] = handlers
+        return handlers
+
+    def dispatch(self, address: str, params) -> int:
+        """Call all the handlers matching an address, returns their number."""
+        handlers = self.handlers_for_address(address)
+        for handler in handlers:
+            handler(address, *params)
+        if not handlers and self._default_handler is not None:
+            self._default_handler(address, *params)
+        return len(handlers)
+
+    def dispatch_dgram(self, dgram, start: int = 0, end: int = None) -> None:
+        """Parse and dispatch a message or bundle datagram.
+
+        Bundle elements are parsed in place and dispatched immediately and
+        in order (timetags are not scheduled).
+
+        Raises:
+          - ParseError: if the datagram could not be parsed.
+        """
+        if end is None:
+            end = len(dgram)
+        if dgram[start:start + len(_BUNDLE_PREFIX)] == _BUNDLE_PREFIX:
+            index = start + len(_BUNDLE_PREFIX) + 8
+            while index + 4 <= end:
+                size = struct.unpack_from('>i', dgram, index)[0]
+                index += 4
+                if size < 0 or index + size > end:
+                    raise osc_view.ParseError('Bundle element size out of bounds')
+                self.dispatch_dgram(dgram, index, index + size)
+                index += size
+            return
+        address, params = osc_view.parse_message(dgram, start, end)
+        self.dispatch(address, params)
@@ -0,0 +1,121 @@
+"""Compiled codecs for OSC messages with a fixed-size type tag.
+
+A type tag made only of fixed-size types (e.g. 'iif') always yields the
+same binary layout, which can be described by a single struct format.
+Codecs are compiled once per type tag and kept in a small LRU cache, so
+that a whole message is encoded with one pack and decoded with one
+unpack_from. Type tags with strings, blobs, arrays or other exotic
+types have no codec and use the generic path.
+"""
+
+import struct
+
+from osc import osc_types
+
+# Struct format of each fixed-size argument type (empty if no payload).
+_ARG_FORMATS = {
+    'i': 'i', 'h': 'q', 'f': 'f', 'd': 'd', 'r': 'I',
+    'T': '', 'F': '', 'N': ''}
+# Values of the types without payload.
+_ARG_CONSTANTS = {'T': True, 'F': False, 'N': None}
+# Maximum number of codecs kept in cache, and longest type tag compiled.
+CACHE_SIZE = 32
+MAX_TYPETAG_LEN = 64
+
+
+class OscCodec(object):
+    """Precomputed struct layout of a fixed-size type tag."""
+
+    def __init__(self, typetag: str) -> None:
+        """Compile the layout of the type tag.
+
+        Args:
+          - typetag: The argument types (without leading comma).
+        Raises:
+          - ValueError: if the type tag contains variable-size types.
+        """
+        fmt = '>'
+        for arg_type in typetag:
+            if arg_type not in _ARG_FORMATS:
+                raise ValueError('No fixed-size codec for type {}'.format(arg_type))
+            fmt += _ARG_FORMATS[arg_type]
+        self.typetag = typetag
+        self.fmt = fmt
+        self.size = struct.calcsize(fmt)
+        # Positions of constant (payload-free) arguments, if any.
+        self._constants = [(i, _ARG_CONSTANTS[t]) for i, t in enumerate(typetag)
+                           if t in _ARG_CONSTANTS] or None
+        # Offset of each argument relative to the start of the payload.
+        self.offsets = []
+        offset = 0
+        for arg_type in typetag:
+            self.offsets.append(offset)
+            offset += struct.calcsize('>' + _ARG_FORMATS[arg_type])
+
+    def unpack_from(self, dgram, index: int) -> list:
+        """Decode all the arguments starting at index.
+
+        Raises:
+          - ParseError: if the datagram is too short.
+        """
+        try:
+            values = list(struct.unpack_from(self.fmt, dgram, index))
+        except struct.error as e:
+            raise osc_types.ParseError('Could not parse datagram %s' % e)
+        if self._constants is not None:
+            for i, val in self._constants:
+                values.insert(i, val)
+        return values
+
+    def pack(self, values) -> bytes:
+        """Encode the arguments (without the payload-free ones).
+
+        Raises:
+          - BuildError: if the values do not match the type tag.
+        """
+        try:
+            return struct.pack(self.fmt, *values)
+        except (struct.error, TypeError, OverflowError) as e:
+            raise osc_types.BuildError('Wrong argument values passed: {}'.format(e))
+
+    def pack_into(self, buffer, index: int, values) -> None:
+        """Encode the arguments in place (without the payload-free ones).
+
+        Raises:
+          - BuildError: if the values do not match the type tag.
+        """
+        try:
+            struct.pack_into(self.fmt, buffer, index, *values)
+        except (struct.error, TypeError, OverflowError) as e:
+            raise osc_types.BuildError('Wrong argument values passed: {}'.format(e))
+
+
+# LRU cache of compiled codecs (None for type tags without codec).
+_cache = {}
+_order = []
+
+
+def get_codec(typetag: str):
+    """Returns the (cached) codec of a type tag, or None if it has none.
+
+    Args:
+      - typetag: The argument types, with or without the leading comma.
+    """
+    if typetag.startswith(','):
+        typetag = typetag[1:]
+    if typetag in _cache:
+        if _order[-1] != typetag:
+            _order.remove(typetag)
+            _order.append(typetag)
+        return _cache[typetag]
+    codec = None
+    if len(typetag) <= MAX_TYPETAG_LEN:
+        try:
+            codec = OscCodec(typetag)
+        except ValueError:
+            pass
+    _cache[typetag] = codec
+    _order.append(typetag)
+    while len(_order) > CACHE_SIZE:
+        del _cache[_order.pop(0)]
+    return codec
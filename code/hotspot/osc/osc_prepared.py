@@ -0,0 +1,137 @@
+"""Prepared OSC messages, encoded once and updated in place."""
+
+from osc import osc_codec
+from osc import osc_types
+
+
+class OscPreparedMessage(object):
+    """A fixed-layout OSC message whose arguments are written in place.
+
+    The address and the type tag string are encoded once into a
+    preallocated bytearray. Only fixed-size argument types are allowed,
+    so that every value has a known offset and a whole set of new values
+    is written with a single struct.pack_into call (see osc_codec).
+    """
+
+    def __init__(self, address: str, typetag: str) -> None:
+        """Encode the static part of the message.
+
+        Args:
+          - address: The osc address to send this message to.
+          - typetag: The argument types (e.g. 'iif'), with or without
+                     the leading comma.
+        Raises:
+          - ValueError: if the type tag contains variable-size types.
+          - BuildError: if the address or type tag could not be encoded.
+        """
+        if typetag.startswith(','):
+            typetag = typetag[1:]
+        codec = osc_codec.get_codec(typetag)
+        if codec is None:
+            raise ValueError(
+                'Prepared messages only support fixed-size types, got {}'.format(typetag))
+        if not address:
+            raise osc_types.BuildError('OSC addresses cannot be empty')
+        header = osc_types.write_string(address) + osc_types.write_string(',' + typetag)
+        self._address = address
+        self._typetag = typetag
+        self._codec = codec
+        self._offset = len(header)
+        self._buffer = bytearray(self._offset + codec.size)
+        self._buffer[:self._offset] = header
+
+    @property
+    def address(self) -> str:
+        """Returns the OSC address of this message."""
+        return self._address
+
+    @property
+    def typetag(self) -> str:
+        """Returns the type tag string (without leading comma)."""
+        return self._typetag
+
+    @property
+    def size(self) -> int:
+        """Returns the length of the datagram for this message."""
+        return len(self._buffer)
+
+    @property
+    def dgram(self) -> bytearray:
+        """Returns the (mutable) datagram holding the last packed values."""
+        return self._buffer
+
+    def pack(self, *values) -> bytearray:
+        """Write a new set of values in place and return the datagram.
+
+        Raises:
+          - BuildError: if the values do not match the type tag.
+        """
+        self._codec.pack_into(self._buffer, self._offset, values)
+        return self._buffer
+
+
+class OscTypedEncoder(object):
+    """Encoder of messages with a known address and type tag.
+
+    The address and type tag string are encoded and validated once, and the
+    writer of each argument is resolved up front, so that encoding a message
+    skips any type inference. Unlike OscPreparedMessage, variable-size types
+    (strings and blobs) are supported, hence a new datagram is built for
+    each message.
+    """
+
+    # Writer of each argument type (None for types without payload).
+    _ARG_WRITERS = {
+        'i': osc_types.write_int, 'h': osc_types.write_int64,
+        'f': osc_types.write_float, 'd': osc_types.write_double,
+        's': osc_types.write_string, 'b': osc_types.write_blob,
+        'r': osc_types.write_rgba, 'm': osc_types.write_midi,
+        't': osc_types.write_ntp_timetag,
+        'T': None, 'F': None, 'N': None}
+
+    def __init__(self, address: str, typetag: str) -> None:
+        """Encode the static part of the message.
+
+        Args:
+          - address: The osc address to send this message to.
+          - typetag: The argument types (e.g. 'iss'), with or without
+                     the leading comma.
+        Raises:
+          - ValueError: if the type tag contains unsupported types.
+          - BuildError: if the address or type tag could not be encoded.
+        """
+        if typetag.startswith(','):
+            typetag = typetag[1:]
+        for arg_type in typetag:
+            if arg_type not in self._ARG_WRITERS:
+                raise ValueError('Unsupported type {} in type tag'.format(arg_type))
+        if not address:
+            raise osc_types.BuildError('OSC addresses cannot be empty')
+        self._address = address
+        self._typetag = typetag
+        self._header = osc_types.write_string(address) + osc_types.write_string(',' + typetag)
+        self._writers = [self._ARG_WRITERS[t] for t in typetag if self._ARG_WRITERS[t]]
+
+    @property
+    def address(self) -> str:
+        """Returns the OSC address of this message."""
+        return self._address
+
+    @property
+    def typetag(self) -> str:
+        """Returns the type tag string (without leading comma)."""
+        return self._typetag
+
+    def pack(self, *values) -> bytes:
+        """Encode a message with the given values (payload types only).
+
+        Raises:
+          - BuildError: if the values do not match the type tag.
+        """
+        if len(values) != len(self._writers):
+            raise osc_types.BuildError('Expected {} values for type tag {}, got {}'.format(
+                len(self._writers), self._typetag, len(values)))
+        dgram = [self._header]
+        for writer, value in zip(self._writers, values):
+            dgram.append(writer(value))
+        return b''.join(dgram)
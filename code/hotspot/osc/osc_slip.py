@@ -0,0 +1,82 @@
+"""SLIP framing of OSC packets on stream transports (OSC 1.1).
+
+On a TCP connection, each OSC packet is sent as a SLIP frame (RFC 1055),
+delimited by END bytes both before and after it (the leading END also
+flushes any garbage left by a broken connection):
+
+    END (0xC0) | packet, END -> ESC ESC_END and ESC -> ESC ESC_ESC | END
+
+Since an END byte always closes a frame, a receiver can resynchronise on
+the next frame after a partial write.
+"""
+
+END = b'\xc0'
+ESC = b'\xdb'
+_ESC_END = b'\xdb\xdc'
+_ESC_ESC = b'\xdb\xdd'
+
+
+def encode(dgram) -> bytes:
+    """Frame an OSC packet.
+
+    Args:
+      - dgram: The datagram of the OSC message or bundle.
+    Returns:
+      - The SLIP frame (delimited by END bytes).
+    """
+    dgram = bytes(dgram)
+    return END + dgram.replace(ESC, _ESC_ESC).replace(END, _ESC_END) + END
+
+
+def decode(frame) -> bytes:
+    """Restore the OSC packet of a frame (without its END bytes)."""
+    return bytes(frame).replace(_ESC_END, END).replace(_ESC_ESC, ESC)
+
+
+class SlipDecoder(object):
+    """Splits the bytes read from a stream into OSC packets."""
+
+    def __init__(self, max_size: int = 4096) -> None:
+        """Create an empty decoder.
+
+        Args:
+          - max_size: Largest frame accepted, longer frames are dropped.
+        """
+        self._buffer = b''
+        self._max_size = max_size
+        self._dropping = False
+        self.errors = 0
+
+    def feed(self, data) -> list:
+        """Add bytes read from the stream.
+
+        Args:
+          - data: The received bytes.
+        Returns:
+          - The list of the OSC packets completed by these bytes.
+        """
+        packets = []
+        self._buffer += bytes(data)
+        start = 0
+        while True:
+            index = self._buffer.find(END, start)
+            if index < 0:
+                break
+            if self._dropping:
+                self._dropping = False
+            elif index > start:
+                packets.append(decode(self._buffer[start:index]))
+            start = index + 1
+        if start:
+            self._buffer = self._buffer[start:]
+        if len(self._buffer) > self._max_size:
+            # Frame too long (or not SLIP): skip it up to its END
+            self._buffer = b''
+            self._dropping = True
+            self.errors += 1
+        return packets
+
+    def reset(self) -> None:
+        """Forget the partial frame (e.g. after a reconnection)."""
+        self._buffer = b''
+        self._dropping = False
@@ -3,7 +3,6 @@
 import struct
 
 from osc import ntp
-from datetime import datetime, timedelta, date
 
 
 class ParseError(Exception):
@@ -205,12 +204,8 @@ def get_timetag(dgram: bytes, start_index: int):
 
         timetag, _ = get_uint64(dgram, start_index)
         seconds, fraction = ntp.parse_timestamp(timetag)
-
-        hours, seconds = seconds // 3600, seconds % 3600
-        minutes, seconds = seconds // 60, seconds % 60
-
-        utc = (datetime.combine(ntp._NTP_EPOCH, datetime.min.time()) +
-               timedelta(hours=hours, minutes=minutes, seconds=seconds))
+        # Calendar conversion (imports datetime on first use).
+        utc = ntp.timetag_to_datetime(seconds << 32)
 
         return (utc, fraction), start_index + _TIMETAG_DGRAM_LEN
     except (struct.error, TypeError) as e:
@@ -311,6 +306,8 @@ def get_blob(dgram: bytes, start_index: int):
       ParseError if the datagram could not be parsed.
     """
     size, int_offset = get_int(dgram, start_index)
+    if size < 0:
+        raise ParseError('Negative blob size')
     # Make the size a multiple of 32 bits.
     total_size = size + (-size % _BLOB_DGRAM_PAD)
     end_index = int_offset + size
@@ -327,11 +324,73 @@ def write_blob(val: bytes) -> bytes:
     """
     if not val:
         raise BuildError('Blob value cannot be empty')
-    dgram = write_int(len(val))
-    dgram += val
-    while len(dgram) % _BLOB_DGRAM_PAD != 0:
-        dgram += b'\x00'
-    return dgram
+    return write_int(len(val)) + val + b'\x00' * (-len(val) % _BLOB_DGRAM_PAD)
+
+
+def write_blob_into(buffer, index: int, val) -> int:
+    """Writes the datagram of a blob straight into a preallocated buffer.
+
+    Args:
+      buffer: A writable buffer (bytearray) large enough for the blob.
+      index: An index where the blob starts in the buffer.
+      val: The blob content (any buffer object).
+
+    Returns:
+      The index following the (padded) blob in the buffer.
+
+    Raises:
+      - BuildError if the value was empty or does not fit in the buffer.
+    """
+    size = len(val)
+    if not size:
+        raise BuildError('Blob value cannot be empty')
+    end = index + _INT_DGRAM_LEN + size + (-size % _BLOB_DGRAM_PAD)
+    if end > len(buffer):
+        raise BuildError('Blob does not fit in the buffer')
+    struct.pack_into('>i', buffer, index, size)
+    view = memoryview(buffer)
+    view[index + _INT_DGRAM_LEN:index + _INT_DGRAM_LEN + size] = val
+    for k in range(index + _INT_DGRAM_LEN + size, end):
+        buffer[k] = 0
+    return end
+
+
+def get_ntp_timetag(dgram: bytes, start_index: int):
+    """Get a 64-bit OSC time tag from the datagram as an integer.
+
+    Unlike get_timetag and get_date, the time tag is kept as an integer
+    32.32 fixed-point number of seconds since 1900 (ntp.TIMETAG_IMMEDIATELY
+    meaning immediately), without any float or datetime conversion.
+
+    Args:
+      dgram: A datagram packet.
+      start_index: An index where the osc time tag starts in the datagram.
+
+    Returns:
+      A tuple containing the integer time tag and the new end index.
+
+    Raises:
+      ParseError if the datagram could not be parsed.
+    """
+    if start_index < 0 or len(dgram) - start_index < _TIMETAG_DGRAM_LEN:
+        raise ParseError('Datagram is too short')
+    try:
+        return (struct.unpack_from('>Q', dgram, start_index)[0],
+                start_index + _TIMETAG_DGRAM_LEN)
+    except (struct.error, TypeError) as e:
+        raise ParseError('Could not parse datagram %s' % e)
+
+
+def write_ntp_timetag(timetag: int) -> bytes:
+    """Returns the datagram for an integer 64-bit OSC time tag.
+
+    Raises:
+      - BuildError if the time tag could not be converted.
+    """
+    try:
+        return struct.pack('>Q', timetag)
+    except (struct.error, OverflowError) as e:
+        raise BuildError('Wrong argument value passed: {}'.format(e))
 
 
 def get_date(dgram: bytes, start_index: int):
@@ -0,0 +1,180 @@
+"""Zero-copy parsing of OSC messages.
+
+Produces the same results as osc_message.OscMessage, but reads fixed-size
+arguments in place with struct.unpack_from and finds string terminators
+with a single find, so that the parsing cost grows linearly with the size
+of the message. Messages can be parsed directly inside a larger buffer
+(e.g. a receive buffer or a bundle) through the start and end indices.
+"""
+
+import struct
+
+from osc import osc_types
+from osc.osc_message import ParseError
+
+# Struct format and size of the fixed-size argument types.
+_FIXED_TYPES = {
+    'i': ('>i', 4), 'h': ('>q', 8), 'f': ('>f', 4), 'd': ('>d', 8), 'r': ('>I', 4)}
+_STRING_DGRAM_PAD = 4
+
+
+def get_string(dgram, index: int, end: int):
+    """Get a python string from the datagram, starting at index.
+
+    Args:
+      dgram: A datagram packet (bytes or bytearray).
+      index: An index where the string starts in the datagram.
+      end: Index of the end of the message in the datagram.
+
+    Returns:
+      A tuple containing the string and the new end index.
+
+    Raises:
+      ParseError if the datagram could not be parsed.
+    """
+    stop = dgram.find(b'\x00', index, end)
+    if stop < 0:
+        raise ParseError('Could not parse datagram, unterminated string')
+    length = stop - index
+    next_index = index + length + _STRING_DGRAM_PAD - (length % _STRING_DGRAM_PAD)
+    if next_index > end:
+        raise ParseError('Datagram is too short')
+    try:
+        # Padding bytes are dropped (not just cut), as done by osc_types.get_string.
+        return bytes(dgram[index:next_index]).replace(b'\x00', b'').decode('utf-8'), next_index
+    except UnicodeError as e:
+        raise ParseError('Could not parse datagram %s' % e)
+
+
+def parse_message(dgram, start: int = 0, end: int = None):
+    """Parse the address and parameters of an OSC message.
+
+    Args:
+      dgram: A datagram packet (bytes or bytearray).
+      start: Index where the message starts in the datagram.
+      end: Index where the message ends (defaults to the datagram length).
+
+    Returns:
+      A tuple containing the address and the list of parameters.
+
+    Raises:
+      ParseError if the datagram could not be parsed.
+    """
+    if end is None:
+        end = len(dgram)
+    view = memoryview(dgram)
+    address, index = get_string(dgram, start, end)
+    if index >= end:
+        # No params is legit, just return now.
+        return address, []
+    type_tag, index = get_string(dgram, index, end)
+    if type_tag.startswith(','):
+        type_tag = type_tag[1:]
+    params = []
+    param_stack = [params]
+    try:
+        for param in type_tag:
+            fixed = _FIXED_TYPES.get(param)
+            if fixed is not None:
+                fmt, size = fixed
+                if size < 0 or index + size > end:
+                    if param != 'f':
+                        raise ParseError('Datagram is too short')
+                    # Pad truncated floats, as done by osc_types.get_float.
+                    val = struct.unpack(fmt, bytes(view[index:end]) + b'\x00' * (index + size - end))[0]
+                else:
+                    val = struct.unpack_from(fmt, dgram, index)[0]
+                index += size
+            elif param == "s":  # String.
+                val, index = get_string(dgram, index, end)
+            elif param == "b":  # Blob.
+                if index + 4 > end:
+                    raise ParseError('Datagram is too short')
+                size = struct.unpack_from('>i', dgram, index)[0]
+                index += 4
+                if size < 0 or index + size > end:
+                    raise ParseError('Datagram is too short.')
+                val = bytes(view[index:index + size])
+                index += size + (-size % 4)
+            elif param == "m":  # MIDI.
+                if index + 4 > end:
+                    raise ParseError('Datagram is too short')
+                val = struct.unpack_from('>4B', dgram, index)
+                index += 4
+            elif param == "t":  # osc time tag.
+                if index + 8 > end:
+                    raise ParseError('Datagram is too short')
+                val = osc_types.get_timetag(bytes(view[index:index + 8]), 0)[0]
+                index += 8
+            elif param == "T":  # True.
+                val = True
+            elif param == "F":  # False.
+                val = False
+            elif param == "N":  # Nil.
+                val = None
+            elif param == "[":  # Array start.
+                array = []
+                param_stack[-1].append(array)
+                param_stack.append(array)
+                continue
+            elif param == "]":  # Array stop.
+                if len(param_stack) < 2:
+                    raise ParseError('Unexpected closing bracket in type tag: {0}'.format(type_tag))
+                param_stack.pop()
+                continue
+            else:
+                continue
+            param_stack[-1].append(val)
+    except (struct.error, osc_types.ParseError) as e:
+        raise ParseError('Found incorrect datagram, ignoring it', e)
+    if len(param_stack) != 1:
+        raise ParseError('Missing closing bracket in type tag: {0}'.format(type_tag))
+    return address, params
+
+
+class OscMessageView(object):
+    """Drop-in replacement of OscMessage using the zero-copy parser.
+
+    The datagram is parsed lazily, the first time the address or the
+    parameters are accessed.
+    """
+
+    def __init__(self, dgram: bytes) -> None:
+        self._dgram = dgram
+        self._address = None
+        self._parameters = None
+
+    def _parse(self) -> None:
+        if self._parameters is None:
+            self._address, self._parameters = parse_message(self._dgram)
+
+    @property
+    def address(self) -> str:
+        """Returns the OSC address regular expression."""
+        self._parse()
+        return self._address
+
+    @staticmethod
+    def dgram_is_message(dgram: bytes) -> bool:
+        """Returns whether this datagram starts as an OSC message."""
+        return dgram.startswith(b'/')
+
+    @property
+    def size(self) -> int:
+        """Returns the length of the datagram for this message."""
+        return len(self._dgram)
+
+    @property
+    def dgram(self) -> bytes:
+        """Returns the datagram from which this message was built."""
+        return self._dgram
+
+    @property
+    def params(self):
+        """Convenience method for list(self) to get the list of parameters."""
+        return list(self)
+
+    def __iter__(self):
+        """Returns an iterator over the parameters of this message."""
+        self._parse()
+        return iter(self._parameters)
@@ -0,0 +1,132 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ registry.py : Registry of the boards (and live host) seen by the hotspot
+
+ Each packet only updates the last time its board was seen (O(1)). Expiry
+ relies on a heap of deadlines that is refreshed lazily: when a deadline is
+ reached, the board is either expired or pushed back with its new deadline,
+ so that the cost is bounded per timeout period instead of per packet.
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+from utils import ticks_ms, ticks_diff, ticks_add
+
+try:
+    import heapq
+except ImportError:
+    import uheapq as heapq
+
+# Key of the live host in the deadlines
+LIVE = -1
+
+class Registry:
+    """
+    Boards (and live host) alive on the hotspot, with their IP.
+
+    Example :
+    >>> registry = Registry(capacity = 22, timeout_ms = 10000)
+    >>> registry.seen(b_id, ip) # On each packet of a board
+    >>> registry.expire() # On each wake-up
+    >>> if registry.changed: # Redraw only when needed
+    >>>     screen.hotspot(name, status, registry.live_ip, registry.boards())
+    """
+
+    def __init__(self,
+            capacity: int = 22,
+            timeout_ms: int = 10000):
+        """
+        Args:
+            capacity: Maximum number of boards (ids 0 to capacity - 1), 0 for no limit
+            timeout_ms: Time before considering a board (or live) dead
+        """
+        self.capacity = capacity
+        self.timeout_ms = timeout_ms
+        self.lastseen = {}
+        self.ips = {}
+        self.index = {}
+        self.deadlines = []
+        self.live_ip = ''
+        self.live_lastseen = 0
+        self.changed = True
+        # Statistics
+        self.packets = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self.lastseen)
+
+    def lookup(self, ip: str) -> int:
+        """ Board id of a known IP (-1 if unknown) """
+        return self.index.get(ip, -1)
+
+    def seen(self, b_id: int, ip: str, now: int = None) -> bool:
+        """ Register a packet of a board, returns False if the id is out of capacity """
+        if b_id < 0 or (self.capacity and b_id >= self.capacity):
+            return False
+        if now is None:
+            now = ticks_ms()
+        self.packets += 1
+        if b_id not in self.lastseen:
+            heapq.heappush(self.deadlines, (ticks_add(now, self.timeout_ms), b_id))
+            self.changed = True
+        self.lastseen[b_id] = now
+        if self.ips.get(b_id) != ip:
+            self.index.pop(self.ips.get(b_id), None)
+            self.ips[b_id] = ip
+            self.index[ip] = b_id
+            self.changed = True
+        return True
+
+    def seen_live(self, ip: str, now: int = None):
+        """ Register a packet of the live host """
+        if now is None:
+            now = ticks_ms()
+        if not self.live_ip:
+            heapq.heappush(self.deadlines, (ticks_add(now, self.timeout_ms), LIVE))
+        if self.live_ip != ip:
+            self.live_ip = ip
+            self.changed = True
+        self.live_lastseen = now
+
+    def expire(self, now: int = None) -> int:
+        """ Remove the boards (and live) not seen for timeout_ms, returns their number """
+        if now is None:
+            now = ticks_ms()
+        n_expired = 0
+        while self.deadlines and ticks_diff(now, self.deadlines[0][0]) >= 0:
+            _, key = heapq.heappop(self.deadlines)
+            last = self.live_lastseen if key == LIVE else self.lastseen[key]
+            deadline = ticks_add(last, self.timeout_ms)
+            if ticks_diff(now, deadline) < 0:
+                # Seen since, push back with its new deadline
+                heapq.heappush(self.deadlines, (deadline, key))
+                continue
+            if key == LIVE:
+                self.live_ip = ''
+            else:
+                del self.lastseen[key]
+                self.index.pop(self.ips.pop(key), None)
+                n_expired += 1
+            self.changed = True
+        self.expired += n_expired
+        return n_expired
+
+    def next_timeout(self, max_ms: int, now: int = None) -> int:
+        """ Time until the next deadline (at most max_ms), to be used as poll timeout """
+        if not self.deadlines:
+            return max_ms
+        if now is None:
+            now = ticks_ms()
+        return max(0, min(max_ms, ticks_diff(self.deadlines[0][0], now)))
+
+    def boards(self) -> list:
+        """ Status (0 / 1) of each board id, for display """
+        size = self.capacity or (max(self.lastseen) + 1 if self.lastseen else 0)
+        status = [0] * size
+        for b_id in self.lastseen:
+            status[b_id] = 1
+        return status
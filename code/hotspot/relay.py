@@ -0,0 +1,112 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ relay.py : Aggregating OSC relay from the boards to the live host
+
+ In relay mode, the boards send their OSC traffic to the hotspot, which
+ copies each datagram (message or bundle) as an element of a single bundle
+ toward the live host. The bundle is sent when it is full or when the flush
+ interval elapsed since its first element. Elements are appended in their
+ order of arrival, so that the order of the messages of each board is
+ preserved.
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+from osc.osc_bundle_builder import OscBundleWriter
+from utils import ticks_ms, ticks_diff
+
+def is_osc(dgram) -> bool:
+    """ Whether a datagram looks like an OSC message or bundle """
+    return len(dgram) >= 4 and (dgram[0] == 0x2F or dgram[:8] == b'#bundle\x00')
+
+class OSCRelay:
+    """
+    Re-bundles the OSC traffic of the boards toward the live host.
+
+    Example :
+    >>> relay = OSCRelay(sock, port = 2324, max_size = 1400, flush_ms = 10)
+    >>> relay.add(dgram) # For each OSC datagram of a board
+    >>> relay.poll(live_ip) # On each wake-up, sends the bundle when due
+    """
+
+    def __init__(self,
+            sock,
+            port: int = 2324,
+            max_size: int = 1400,
+            flush_ms: int = 10):
+        """
+        Args:
+            sock: Socket used to send the bundles
+            port: Port of the live host (Max udpreceive)
+            max_size: Maximum size of a bundle
+            flush_ms: Maximum time an element waits in the bundle
+        """
+        self.sock = sock
+        self.port = port
+        self.flush_ms = flush_ms
+        self.bundle = OscBundleWriter(max_size)
+        self.first = 0
+        self.dest_ip = ''
+        # Statistics
+        self.relayed = 0
+        self.bundles = 0
+        self.dropped = 0
+
+    def add(self, dgram, now: int = None):
+        """ Append a board datagram to the pending bundle """
+        if now is None:
+            now = ticks_ms()
+        if self.bundle.num_contents == 0:
+            self.first = now
+        if self.bundle.add(dgram):
+            self.relayed += 1
+            return
+        # Keep the order: send the pending bundle before this datagram
+        self.flush()
+        self.first = now
+        if self.bundle.add(dgram):
+            self.relayed += 1
+        else:
+            # Larger than a bundle, sent on its own
+            self.send(dgram)
+
+    def send(self, dgram):
+        if not self.dest_ip:
+            self.dropped += 1
+            return
+        try:
+            self.sock.sendto(dgram, (self.dest_ip, self.port))
+            self.bundles += 1
+        except OSError:
+            self.dropped += 1
+
+    def flush(self):
+        """ Send the pending bundle (if any) """
+        if self.bundle.num_contents == 0:
+            return
+        if not self.dest_ip:
+            self.dropped += self.bundle.num_contents
+        else:
+            self.send(self.bundle.dgram)
+        self.bundle.reset()
+
+    def poll(self, dest_ip: str, now: int = None):
+        """ Send the pending bundle to the live host if the flush interval elapsed """
+        self.dest_ip = dest_ip
+        if self.bundle.num_contents == 0:
+            return
+        if now is None:
+            now = ticks_ms()
+        if ticks_diff(now, self.first) >= self.flush_ms:
+            self.flush()
+
+    def next_timeout(self, max_ms: int, now: int = None) -> int:
+        """ Time until the pending bundle is due (at most max_ms) """
+        if self.bundle.num_contents == 0:
+            return max_ms
+        if now is None:
+            now = ticks_ms()
+        return max(0, min(max_ms, self.flush_ms - ticks_diff(now, self.first)))
@@ -8,9 +8,152 @@
                      <esling@ircam.fr>
 
 """
+import json
+import errno
+import select
 import socket
 from osc.osc_message_builder import OscMessageBuilder
-        
+from osc.osc_prepared import OscPreparedMessage, OscTypedEncoder
+from osc.osc_codec import get_codec
+from osc.osc_bundle_builder import OscBundleWriter
+from osc.osc_message import ParseError
+from osc.osc_slip import SlipDecoder, encode as slip_encode
+from osc.dispatcher import Dispatcher
+from utils import ticks_ms, ticks_diff, ticks_add
+
+# Discovery probe (unicast to a cached host) and its expected answer
+PROBE_ADDRESS = "/probe"
+PROBE_ACK = b"/probe/ack\x00"
+
+# Multicast group of the fleet (announcements and control)
+GROUP = "224.1.1.1"
+GROUP_PORT = 5007
+
+# Queue policies (per address)
+DROP_OLDEST = 0
+COALESCE = 1
+
+class SendQueue:
+    """
+    Non-blocking send queue over a fixed ring of preallocated datagram slots.
+    Datagrams are copied into the next free slot, and sent by pump (from the
+    main loop) at most at the rate allowed by a token bucket. When the queue
+    is full, the oldest datagram is dropped. Datagrams queued with a key that
+    has the COALESCE policy replace the pending datagram with the same key.
+    If the network driver has no buffer left (EAGAIN / ENOMEM), the datagram
+    stays in the queue and is retried at the next pump.
+
+    Example :
+    >>> queue = SendQueue(sock, dest, slots = 16, rate = 200)
+    >>> queue.set_policy("/sensor/light", COALESCE)
+    >>> queue.push(dgram, "/sensor/light")
+    >>> queue.pump() # From the main loop
+    """
+
+    def __init__(self,
+            sock,
+            dest,
+            slots: int = 16,
+            slot_size: int = 1400,
+            rate: int = 0,
+            burst: int = 0):
+        """
+        Args:
+            sock: Non-blocking socket used to send the datagrams
+            dest: Destination (host, port) of the datagrams
+            slots: Number of preallocated datagram slots
+            slot_size: Maximum size of a datagram
+            rate: Maximum number of datagrams per second (0 for no limit)
+            burst: Size of the token bucket (defaults to 1/10th of a second)
+        """
+        self.sock = sock
+        self.dest = dest
+        self.slot_size = slot_size
+        self.buffers = [bytearray(slot_size) for _ in range(slots)]
+        self.views = [memoryview(b) for b in self.buffers]
+        self.lengths = [0] * slots
+        self.keys = [None] * slots
+        self.head = 0
+        self.count = 0
+        self.policies = {}
+        # Token bucket (in thousandths of datagram)
+        self.rate = rate
+        self.capacity = max(1, burst or rate // 10) * 1000
+        self.tokens = self.capacity
+        self.last = ticks_ms()
+        # Statistics
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.errors = 0
+
+    def set_policy(self, key, policy: int):
+        """ Set the policy (DROP_OLDEST or COALESCE) of a key (e.g. an address) """
+        self.policies[key] = policy
+
+    def push(self, dgram, key = None) -> bool:
+        """ Copy a datagram into the queue, returns False if it was dropped """
+        length = len(dgram)
+        if length > self.slot_size:
+            self.dropped += 1
+            return False
+        n_slots = len(self.buffers)
+        slot = None
+        if key is not None and self.policies.get(key) == COALESCE:
+            for i in range(self.count):
+                cur = (self.head + i) % n_slots
+                if self.keys[cur] == key:
+                    slot = cur
+                    self.coalesced += 1
+                    break
+        if slot is None:
+            if self.count == n_slots:
+                # Drop the oldest datagram
+                self.head = (self.head + 1) % n_slots
+                self.count -= 1
+                self.dropped += 1
+            slot = (self.head + self.count) % n_slots
+            self.count += 1
+        self.views[slot][:length] = dgram
+        self.lengths[slot] = length
+        self.keys[slot] = key
+        return True
+
+    def refill(self):
+        """ Add the tokens earned since the last refill """
+        now = ticks_ms()
+        elapsed = ticks_diff(now, self.last)
+        self.last = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def pump(self, max_packets: int = 8) -> int:
+        """ Send pending datagrams without blocking, returns the number sent """
+        if self.rate:
+            self.refill()
+        n_sent = 0
+        while self.count and n_sent < max_packets:
+            if self.rate and self.tokens < 1000:
+                break
+            slot = self.head
+            try:
+                self.sock.sendto(self.views[slot][:self.lengths[slot]], self.dest)
+            except OSError as e:
+                if e.args[0] in (errno.EAGAIN, errno.ENOMEM):
+                    # Driver buffers are full, retry at the next pump
+                    self.retries += 1
+                    break
+                self.errors += 1
+            else:
+                self.sent += 1
+                n_sent += 1
+            if self.rate:
+                self.tokens -= 1000
+            self.keys[slot] = None
+            self.head = (slot + 1) % len(self.buffers)
+            self.count -= 1
+        return n_sent
+
 class OSCClient:
     """
     Generic class for defining a OSC client on ESP32.
@@ -19,12 +162,45 @@ class OSCClient:
     
     def __init__(self,     
             host: str = '127.0.0.1',
-            port: int = 2323):
+            port: int = 2323,
+            bundle_size: int = 0,
+            queue_slots: int = 0,
+            rate: int = 0,
+            seq: bool = False,
+            b_id: int = 0):
         self.host = host
         self.port = port
         self.dest = (host, port)
         self.sock = None
+        # Prepared messages, keyed by (address, typetag)
+        self._prepared = {}
+        # Pending bundle (if messages are coalesced until flush)
+        self.bundle = None
+        # Synchronised clock giving the bundle timetags (see clock.ClockSync)
+        self.clock = None
+        if (bundle_size > 0):
+            self.bundle = OscBundleWriter(bundle_size)
+        # Addresses with the COALESCE policy, and their latest pending message
+        self.coalesce = set()
+        self.latest = {}
+        # Sequence number of the bundles (first element /seq board id, number),
+        # or without bundles of a /seq message sent at each flush after data
+        self.b_id = b_id
+        self.seq = 0
+        self.seq_pending = False
+        self.seq_msg = OscPreparedMessage("/seq", "ii") if seq else None
+        # Room taken by the /seq element in a bundle
+        self.seq_room = 4 + len(self.seq_msg.pack(0, 0)) if seq else 0
+        # Statistics
+        self.sent = 0
+        self.errors = 0
         self.create_socket()
+        # Non-blocking send queue (if datagrams are sent from pump)
+        self.queue = None
+        if (queue_slots > 0):
+            self.sock.setblocking(False)
+            self.queue = SendQueue(self.sock, self.dest, queue_slots,
+                slot_size = max(bundle_size, 1400), rate = rate)
         
     def create_socket(self):
         """ Instantiate the client socket """
@@ -37,8 +213,8 @@ class OSCClient:
         print(self.dest)
         self.sock.sendto(msg.encode(), self.dest)
         
-    def send_osc(self, address: str, value: ArgValue) -> None:
-        """ Send a message formatted for 
+    def encode_osc(self, address: str, value) -> bytes:
+        """ Encode a message as a raw OSC datagram (without parsing it back)
 
         Args:
             address: OSC address the message shall go to
@@ -53,8 +229,155 @@ class OSCClient:
             values = value
         for val in values:
             builder.add_arg(val)
-        msg = builder.build()
-        self.sock.sendto(msg.dgram, self.dest)
+        return builder.build_dgram()
+
+    def send_osc(self, address: str, value) -> None:
+        """ Send a message formatted for OSC (types inferred from the values)
+
+        This generic path is kept for compatibility, prefer send_typed when
+        the types of the arguments are known.
+
+        Args:
+            address: OSC address the message shall go to
+            value: One or more arguments to be added to the message
+        """
+        self.send_dgram(self.encode_osc(address, value))
+
+    def prepare(self, address: str, typetag: str) -> OscPreparedMessage:
+        """ Get the prepared message for an (address, typetag) pair
+
+        The address and type tags are only encoded the first time a pair is
+        requested, subsequent calls return the same preallocated message.
+
+        Args:
+            address: OSC address the message shall go to
+            typetag: Fixed-size argument types of the message (e.g. 'iif')
+        """
+        key = (address, typetag)
+        msg = self._prepared.get(key)
+        if msg is None:
+            msg = OscPreparedMessage(address, typetag)
+            self._prepared[key] = msg
+        return msg
+
+    def send_prepared(self, msg: OscPreparedMessage, *values) -> None:
+        """ Write values in place into a prepared message and send it
+
+        Args:
+            msg: Prepared message obtained through prepare
+            values: Arguments matching the message type tag
+        """
+        self.send_dgram(msg.pack(*values), msg.address)
+
+    def send_typed(self, address: str, typetag: str, *values) -> None:
+        """ Send a message whose argument types are known in advance
+
+        The type tag is validated once per (address, typetag) pair and the
+        corresponding encoder cached, so that no type inference happens.
+        Fixed-size type tags are sent through prepared messages.
+
+        Args:
+            address: OSC address the message shall go to
+            typetag: Argument types of the message (e.g. 'iss')
+            values: Arguments matching the type tag (none for T, F and N)
+        """
+        encoder = typed_encoder(self._prepared, address, typetag)
+        self.send_dgram(encoder.pack(*values), address)
+
+    def send_dgram(self, dgram, key = None) -> None:
+        """ Send a raw OSC datagram, or add it to the pending bundle
+
+        In bundle mode, the bundle is flushed first when the datagram does not
+        fit anymore, and datagrams larger than the bundle are sent on their own.
+        Datagrams of a COALESCE key only keep the latest one until the flush.
+
+        Args:
+            dgram: Datagram to send
+            key: Key of the datagram for the policies (its address)
+        """
+        if self.bundle is None:
+            self.write(dgram, key)
+            self.seq_pending = True
+            return
+        if key is not None and key in self.coalesce:
+            self.latest[key] = bytes(dgram)
+            return
+        self.add(dgram, key)
+
+    def add(self, dgram, key = None) -> None:
+        """ Add a datagram to the pending bundle (bundle mode) """
+        if self.bundle.num_contents and not self.bundle.fits(len(dgram)):
+            self.flush()
+        if self.bundle.num_contents == 0:
+            if not self.bundle.fits(len(dgram) + self.seq_room):
+                # Larger than a bundle, sent on its own (without sequence number)
+                self.write(dgram, key)
+                return
+            if self.seq_msg is not None:
+                self.bundle.add(self.seq_msg.pack(self.b_id, self.seq))
+        self.bundle.add(dgram)
+
+    def write(self, dgram, key = None) -> None:
+        """ Send a datagram right away, or queue it (queue mode) """
+        if self.queue is not None:
+            self.queue.push(dgram, key)
+            return
+        try:
+            self.sock.sendto(dgram, self.dest)
+            self.sent += 1
+        except OSError:
+            self.errors += 1
+
+    def set_policy(self, address: str, policy: int) -> None:
+        """ Set the policy (DROP_OLDEST or COALESCE) of an address
+
+        In bundle mode, COALESCE keeps the latest message of the address
+        between two flushes, in queue mode the latest queued datagram.
+        """
+        if self.queue is not None:
+            self.queue.set_policy(address, policy)
+        if policy == COALESCE:
+            self.coalesce.add(address)
+        else:
+            self.coalesce.discard(address)
+
+    def flush(self) -> None:
+        """ Send the pending bundle (if any) as a single datagram
+
+        Without bundles, a /seq message follows the datagrams sent since the
+        last flush (sequence mode).
+        """
+        if self.bundle is None:
+            if self.seq_msg is not None and self.seq_pending:
+                self.write(self.seq_msg.pack(self.b_id, self.seq), "/seq")
+                self.seq_pending = False
+                self.seq = (self.seq + 1) & 0x7FFFFFFF
+            return
+        if self.latest:
+            # Latest messages of the coalesced addresses
+            latest = self.latest
+            self.latest = {}
+            for key in latest:
+                self.add(latest[key], key)
+        if self.bundle.num_contents == 0:
+            return
+        if self.clock is not None:
+            self.bundle.set_timetag(self.clock.now_timetag())
+        self.write(self.bundle.dgram)
+        self.bundle.reset()
+        self.seq = (self.seq + 1) & 0x7FFFFFFF
+
+    def stats(self) -> tuple:
+        """ Counters of the client (sent, send errors, queue drops, queue retries) """
+        if self.queue is None:
+            return self.sent, self.errors, 0, 0
+        return self.queue.sent, self.errors + self.queue.errors, self.queue.dropped, self.queue.retries
+
+    def pump(self, max_packets: int = 8) -> int:
+        """ Send queued datagrams without blocking (queue mode) """
+        if self.queue is None:
+            return 0
+        return self.queue.pump(max_packets)
 
     def close(self):
         if self.sock:
@@ -67,29 +390,275 @@ class OSCClient:
     def __exit__(self, *args):
         self.close()
             
+class OSCStreamClient:
+    """
+    Reliable OSC client over a persistent TCP connection (SLIP frames).
+    Messages sent while the host is unreachable are kept (at most
+    max_pending) and sent in order once connected, the connection being
+    retried with a doubling delay. Hello messages are sent again at each
+    connection (e.g. after a restart of the host). Messages received from
+    the host are routed through the dispatcher. The connection is opened
+    without blocking (completed from poll, within timeout_ms).
+
+    Example :
+    >>> stream = OSCStreamClient('192.168.4.2', 2326)
+    >>> stream.send_typed("/connect", "iss", 3, "esp32s3", "0:light")
+    >>> stream.poll() # Connects and sends (from the main loop)
+    """
+
+    def __init__(self,
+            host: str = '127.0.0.1',
+            port: int = 2326,
+            dispatcher: Dispatcher = None,
+            timeout_ms: int = 200,
+            reconnect_ms: int = 500,
+            max_reconnect_ms: int = 8000,
+            max_pending: int = 16):
+        self.host = host
+        self.port = port
+        self.dispatcher = dispatcher or Dispatcher()
+        self.timeout_ms = timeout_ms
+        self.reconnect_ms = reconnect_ms
+        self.max_reconnect_ms = max_reconnect_ms
+        self.max_pending = max_pending
+        self.sock = None
+        self.connected = False
+        # Pending connection (writability of the socket) and its start time
+        self.poller = None
+        self.connect_at = 0
+        self.decoder = SlipDecoder()
+        # Frames waiting for the connection, and frames sent at each connection
+        self.pending = []
+        self.hello = {}
+        self._prepared = {}
+        self.backoff = reconnect_ms
+        self.retry_at = ticks_ms()
+        # Statistics
+        self.connections = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def connect(self) -> bool:
+        """ Start opening the connection (non-blocking), True once connected """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        try:
+            self.sock.connect(socket.getaddrinfo(self.host, self.port)[0][-1])
+        except OSError as e:
+            if e.args[0] not in (errno.EINPROGRESS, errno.EAGAIN):
+                self.disconnect()
+                return False
+        self.poller = select.poll()
+        self.poller.register(self.sock, select.POLLOUT)
+        self.connect_at = ticks_ms()
+        return self.check_connect()
+
+    def check_connect(self) -> bool:
+        """ Whether the pending connection is open (then send the waiting frames) """
+        events = self.poller.poll(0)
+        if not events:
+            if ticks_diff(ticks_ms(), self.connect_at) >= self.timeout_ms:
+                self.disconnect()
+            return False
+        if events[0][1] & (select.POLLERR | select.POLLHUP):
+            # Refused or unreachable
+            self.disconnect()
+            return False
+        self.poller = None
+        # Frames are written with a bounded blocking time
+        self.sock.settimeout(self.timeout_ms / 1000)
+        self.connected = True
+        self.connections += 1
+        self.backoff = self.reconnect_ms
+        self.decoder.reset()
+        for frame in self.hello.values():
+            if not self.write(frame):
+                return False
+        return self.send_pending()
+
+    def disconnect(self):
+        """ Drop the connection and schedule the next attempt """
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        self.poller = None
+        self.connected = False
+        self.retry_at = ticks_add(ticks_ms(), self.backoff)
+        self.backoff = min(self.backoff * 2, self.max_reconnect_ms)
+
+    def write(self, frame) -> bool:
+        """ Send a frame on the connection (a frame cut by an error is sent again) """
+        if not self.connected:
+            return False
+        try:
+            self.sock.sendall(frame)
+        except OSError:
+            self.disconnect()
+            return False
+        self.sent += 1
+        return True
+
+    def send_pending(self) -> bool:
+        """ Send the frames kept while disconnected (in order) """
+        while self.pending:
+            if not self.write(self.pending[0]):
+                return False
+            self.pending.pop(0)
+        return True
+
+    def send_dgram(self, dgram) -> None:
+        """ Send an OSC datagram, or keep it until connected """
+        frame = slip_encode(dgram)
+        if not self.pending and self.write(frame):
+            return
+        if len(self.pending) >= self.max_pending:
+            self.pending.pop(0)
+            self.dropped += 1
+        self.pending.append(frame)
+
+    def send_typed(self, address: str, typetag: str, *values) -> None:
+        """ Send a message whose argument types are known (see OSCClient.send_typed) """
+        self.send_dgram(typed_encoder(self._prepared, address, typetag).pack(*values))
+
+    def set_hello(self, address: str, typetag: str, *values) -> None:
+        """ Send a message now (if connected) and at each connection """
+        frame = slip_encode(typed_encoder(self._prepared, address, typetag).pack(*values))
+        self.hello[address] = frame
+        self.write(frame)
+
+    def poll(self, max_packets: int = 8) -> int:
+        """ (Re)connect when due, then handle the messages received, returns their number """
+        if not self.connected:
+            if self.sock is not None:
+                if not self.check_connect():
+                    return 0
+            elif ticks_diff(ticks_ms(), self.retry_at) < 0 or not self.connect():
+                return 0
+        elif not self.send_pending():
+            return 0
+        n = 0
+        self.sock.settimeout(0)
+        try:
+            while n < max_packets:
+                try:
+                    data = self.sock.recv(512)
+                except OSError:
+                    break
+                if not data:
+                    # Closed by the host
+                    self.disconnect()
+                    return n
+                for dgram in self.decoder.feed(data):
+                    n += 1
+                    try:
+                        self.dispatcher.dispatch_dgram(dgram)
+                    except ParseError as e:
+                        self.errors += 1
+                        print("Ignoring invalid OSC frame: %s"%(e))
+                    except Exception as e:
+                        self.errors += 1
+                        print("Error handling OSC frame: %s"%(e))
+        finally:
+            if self.sock:
+                self.sock.settimeout(self.timeout_ms / 1000)
+        return n
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        self.poller = None
+        self.connected = False
+
 class OSCServer:
     """
-    Generic class for defining a UDP client on ESP32.
-    This class mostly relies on sockets to establish communication
+    Generic class for defining a OSC server on ESP32.
+    The server is non-blocking and must be polled (e.g. from the main loop).
+    Datagrams are read into a preallocated buffer and routed to handlers
+    through a Dispatcher.
     """
     
     def __init__(self,     
-            host: str = '127.0.0.1',
-            port: int = 4242):
+            host: str = '0.0.0.0',
+            port: int = 4242,
+            dispatcher: Dispatcher = None,
+            buffer_size: int = 1024,
+            group: str = ''):
         self.host = host
         self.port = port
+        self.group = group
+        self.dispatcher = dispatcher or Dispatcher()
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.sock = None
+        # Invalid datagrams and handler failures
+        self.errors = 0
+        self.create_socket()
+        
+    def create_socket(self):
+        """ Instantiate the (non-blocking) server socket """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.host, self.port))
+        self.sock.setblocking(False)
+        if (self.group):
+            join_group(self.sock, self.group)
+        
+    def receive(self):
+        """ Read one datagram into the buffer without blocking
+
+        Returns:
+            (length, client address), or (0, None) if nothing is pending
+        """
+        try:
+            if hasattr(self.sock, 'recvfrom_into'):
+                return self.sock.recvfrom_into(self.buffer)
+            data, client = self.sock.recvfrom(len(self.buffer))
+        except OSError:
+            return 0, None
+        self.view[:len(data)] = data
+        return len(data), client
+        
+    def poll(self, max_packets: int = 8) -> int:
+        """ Handle pending datagrams (at most max_packets), returns their number """
+        for n in range(max_packets):
+            length, client = self.receive()
+            if not length:
+                return n
+            if self.buffer[0] not in (0x2F, 0x23):
+                # Not OSC (e.g. host announcement on a multicast group)
+                continue
+            try:
+                self.dispatcher.dispatch_dgram(bytes(self.view[:length]))
+            except ParseError as e:
+                self.errors += 1
+                print("Ignoring invalid OSC datagram from %s: %s"%(client, e))
+            except Exception as e:
+                # A handler failed (e.g. wrong arguments), keep serving
+                self.errors += 1
+                print("Error handling OSC datagram from %s: %s"%(client, e))
+        return max_packets
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
 
 class UDPBrodcastClient:
     """
     Generic class for defining a UDP Broadcast client.
     This class is useful for implementing our own mini-discovery algorithm
+    If a multicast group is given, the client also joins it (announcements
+    sent once to the group instead of broadcasted).
     """
     
     def __init__(self,     
             host: str = '255.255.255.255',
-            port: int = 7374):
+            port: int = 7374,
+            group: str = ''):
         self.host = host
         self.port = port
+        self.group = group
         self.dest = (host, port)
         self.sock = None
         self.create_socket()
@@ -105,15 +674,121 @@ class UDPBrodcastClient:
             # Enable broadcasting mode
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
             self.sock.bind(("", self.port))
+            if (self.group):
+                join_group(self.sock, self.group)
             
-    def receive(self):
+    def receive(self, timeout_ms: int = None):
+        """ Wait for the broadcasted host IP (None after timeout_ms) """
         print("Waiting for inbound broadcast IP ...")
+        self.sock.settimeout(None if timeout_ms is None else timeout_ms / 1000)
         # Receive message containing IP
-        data, addr = self.sock.recvfrom(1024)
-        data = str(data, 'utf-8')
+        try:
+            data, addr = self.sock.recvfrom(1024)
+        except OSError:
+            return None
+        if data.startswith(b"/"):
+            # OSC traffic (e.g. probe acknowledgement) is not an announce
+            return None
+        data = str(data, 'utf-8').split('\x00')[0]
         print("Received ~broadcasted~ message: %s"%data)
         return data
+
+    def probe(self, host: str, b_id: int = 0, timeout_ms: int = 50) -> bool:
+        """ Check that a (cached) host is alive with a unicast probe
+
+        The host answers /probe/ack to the address of the probe.
+        """
+        probe = OscPreparedMessage(PROBE_ADDRESS, "i")
+        self.sock.settimeout(timeout_ms / 1000)
+        try:
+            self.sock.sendto(probe.pack(b_id), (host, self.port))
+            while True:
+                data, addr = self.sock.recvfrom(1024)
+                if addr[0] == host and data.startswith(PROBE_ACK):
+                    return True
+        except OSError:
+            return False
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
         
+class Discovery:
+    """
+    Automatic discovery of the host, advanced step by step from a loop.
+    The last host found is cached in flash, and confirmed by a unicast
+    probe at the next boot (probed again between attempts, with a delay
+    doubling up to max_timeout_ms). Otherwise, wait for the IP of the laptop
+    announced on the multicast group (if any) or broadcasted. Each step
+    blocks at most step_ms.
+
+    Example :
+    >>> discovery = Discovery(bc_port = 7374, b_id = 3)
+    >>> host = discovery.tick() # From the main loop, None until found
+    """
+
+    def __init__(self,
+            bc_port: int = 7374,
+            b_id: int = 0,
+            out_port: int = 2323,
+            host_cache: str = "configs/host.json",
+            group: str = '',
+            group_port: int = GROUP_PORT,
+            step_ms: int = 50,
+            max_timeout_ms: int = 4000):
+        self.b_id = b_id
+        self.out_port = out_port
+        self.host_cache = host_cache
+        self.step_ms = step_ms
+        self.max_timeout_ms = max_timeout_ms
+        self.host = None
+        # Connect to broadcast (and multicast group)
+        self.broad_cli = UDPBrodcastClient(port = bc_port)
+        self.group_cli = None
+        if (group):
+            self.group_cli = UDPBrodcastClient(port = group_port, group = group)
+        self.cached = load_host(host_cache)
+        self.start = ticks_ms()
+        self.probe_at = self.start
+        self.backoff = step_ms
+
+    def tick(self):
+        """ One discovery step, returns the host once found (None before) """
+        if self.host is not None:
+            return self.host
+        now = ticks_ms()
+        # 1. Confirm the cached host (when due)
+        if self.cached is not None and ticks_diff(now, self.probe_at) >= 0:
+            self.probe_at = ticks_add(now, self.backoff)
+            self.backoff = min(self.backoff * 2, self.max_timeout_ms)
+            if self.broad_cli.probe(self.cached["host"], self.b_id, self.step_ms):
+                print("Found cached host " + self.cached["host"])
+                return self.found(self.cached["host"])
+            return None
+        # 2. Receive IP from laptop (broadcast as fallback of the group)
+        if self.group_cli is not None:
+            host = self.group_cli.receive(self.step_ms) or self.broad_cli.receive(0)
+        else:
+            host = self.broad_cli.receive(self.step_ms)
+        if host:
+            return self.found(host)
+        return None
+
+    def found(self, host: str) -> str:
+        self.host = host
+        self.close()
+        print("Found host %s in %d ms"%(host, ticks_diff(ticks_ms(), self.start)))
+        cached = self.cached
+        if cached is None or cached["host"] != host or cached.get("port") != self.out_port:
+            save_host(self.host_cache, host, self.out_port)
+        return host
+
+    def close(self):
+        self.broad_cli.close()
+        if self.group_cli is not None:
+            self.group_cli.close()
+
 class OSCManager:
     """
     Key class for OSCServers linking Python and Max / MSP
@@ -136,40 +811,198 @@ class OSCManager:
             in_port: int = 4242,
             bc_port: int = 7374,
             host = '127.0.0.1',
-            discovery: int = 1):
-        super(OSCServer, self).__init__()
+            discovery: int = 1,
+            bundle_size: int = 0,
+            sync_port: int = 0,
+            b_id: int = 0,
+            queue_slots: int = 0,
+            rate: int = 0,
+            host_cache: str = "configs/host.json",
+            group: str = '',
+            group_port: int = GROUP_PORT,
+            seq: bool = False,
+            stats_ms: int = 0,
+            stream_port: int = 0):
         # Server properties
         self.debug = False
         self.in_port = in_port
         self.out_port = out_port
         self.host = host
         self.discovery = discovery
+        self.b_id = b_id
+        self.host_cache = host_cache
+        self.group = group
+        self.group_port = group_port
         # Initialize
         if (discovery):
             # Auto-discovery of server
             self.discover(bc_port)
-        # Creation of client
-        self.client = OSCClient(self.host, self.out_port)
-        # Send an init message to the server
-        self.client.send_osc("/welcome", [])
+        # Creation of client (bundle_size > 0 coalesces messages until flush,
+        # queue_slots > 0 sends from poll at most rate datagrams per second)
+        self.client = OSCClient(self.host, self.out_port,
+            bundle_size = bundle_size, queue_slots = queue_slots, rate = rate,
+            seq = seq, b_id = b_id)
+        # Periodic report of the client counters on /stats
+        self.stats_ms = stats_ms
+        self.stats_last = ticks_ms()
+        # Function counting the values suppressed by the send policies (see policy.py)
+        self.suppressed = None
         # Bindings for server
-        #self.init_bindings(self.osc_attributes)
-        #self.server = osc_server.BlockingOSCUDPServer((ip, in_port), self.dispatcher)
+        self.dispatcher = Dispatcher()
+        self.init_bindings(self.osc_attributes)
+        self.server = OSCServer(port = self.in_port, dispatcher = self.dispatcher)
+        # Reliable control messages (TCP connection to the host, see send_control)
+        self.stream = None
+        if (stream_port):
+            self.stream = OSCStreamClient(self.host, stream_port, dispatcher = self.dispatcher)
+        # Send an init message to the server
+        self.send_control("/welcome", "", hello = True)
+        # Fleet-wide control messages (sent once to the multicast group)
+        self.fleet = None
+        if (group):
+            self.fleet = OSCServer(port = group_port, dispatcher = self.dispatcher, group = group)
+        # Clock synchronisation with the host (timetags of the bundles)
+        self.clock = None
+        if (sync_port):
+            self.init_clock(b_id, sync_port)
+            
+    def init_clock(self, b_id: int, sync_port: int):
+        """ Synchronise with the host clock (pings sent from the server socket) """
+        from clock import ClockSync
+        sync_dest = (self.host, sync_port)
+        self.clock = ClockSync(b_id, send = lambda dgram: self.server.sock.sendto(dgram, sync_dest))
+        self.dispatcher.map("/sync/pong", self.clock.handle_pong)
+        self.client.clock = self.clock
+            
+    def init_bindings(self, osc_attributes: list = []):
+        """ Bind each attribute to its own OSC address (/attribute) """
+        for attribute in osc_attributes:
+            self.dispatcher.map("/" + attribute, osc_attr(self, attribute))
+            
+    def map(self, address: str, handler, parse: bool = False):
+        """ Map an OSC address to a handler(address, *args)
+
+        Args:
+            address: OSC address to bind
+            handler: Function to call on matching messages
+            parse: Transform "key=value" string arguments into kwargs (osc_parse)
+        """
+        if (parse):
+            handler = osc_parse(handler)
+        self.dispatcher.map(address, handler)
             
-    def discover(self, bc_port: int = 7374):
-        """ Procedure for automatic device discovery """
-        # 1. Connect to broadcast
-        broad_cli = UDPBrodcastClient(port = bc_port)
-        # 2. Receive IP from laptop
-        self.host = broad_cli.receive()
-        self.host = str(self.host, 'utf-8').split('\x00')[0]
-        print("Found broadcast host " + self.host)
+    def poll(self, max_packets: int = 8) -> int:
+        """ Send queued messages and handle incoming ones without blocking """
+        if self.clock is not None:
+            self.clock.tick()
+        if self.stats_ms and ticks_diff(ticks_ms(), self.stats_last) >= self.stats_ms:
+            self.send_stats()
+        self.client.pump()
+        n = self.server.poll(max_packets)
+        if self.fleet is not None:
+            n += self.fleet.poll(max_packets)
+        if self.stream is not None:
+            n += self.stream.poll(max_packets)
+        return n
+            
+    def send_stats(self):
+        """ Report the client counters (board id, sequence, sent, send errors, drops, retries, suppressed) """
+        self.stats_last = ticks_ms()
+        suppressed = self.suppressed() if self.suppressed is not None else 0
+        self.client.send_typed("/stats", "iiiiiii", self.b_id, self.client.seq, *self.client.stats(), suppressed)
+        self.client.flush()
+
+    def discover(self,
+            bc_port: int = 7374,
+            timeout_ms: int = 50,
+            max_timeout_ms: int = 4000):
+        """ Procedure for automatic device discovery (blocking, see Discovery) """
+        discovery = Discovery(bc_port, self.b_id, self.out_port, self.host_cache,
+            self.group, self.group_port, timeout_ms, max_timeout_ms)
+        while discovery.tick() is None:
+            pass
+        self.host = discovery.host
         
-    def send_osc(self, address: str, value: ArgValue) -> None:
+    def encode_osc(self, address: str, value) -> bytes:
+        return self.client.encode_osc(address, value)
+
+    def send_osc(self, address: str, value) -> None:
         self.client.send_osc(address, value)
+
+    def prepare(self, address: str, typetag: str) -> OscPreparedMessage:
+        return self.client.prepare(address, typetag)
+
+    def send_prepared(self, msg: OscPreparedMessage, *values) -> None:
+        self.client.send_prepared(msg, *values)
+
+    def send_typed(self, address: str, typetag: str, *values) -> None:
+        self.client.send_typed(address, typetag, *values)
+
+    def send_control(self, address: str, typetag: str, *values, hello: bool = False) -> None:
+        """ Send a control message reliably (stream connection) if enabled, else right away
+
+        Args:
+            address: OSC address the message shall go to
+            typetag: Argument types of the message (e.g. 'iss')
+            values: Arguments matching the type tag
+            hello: Send the message again at each reconnection to the host
+        """
+        if self.stream is None:
+            self.client.send_typed(address, typetag, *values)
+            self.client.flush()
+            self.client.pump()
+        elif hello:
+            self.stream.set_hello(address, typetag, *values)
+        else:
+            self.stream.send_typed(address, typetag, *values)
+
+    def send_dgram(self, dgram, key = None) -> None:
+        """ Send a raw OSC datagram (e.g. from an OscBlockEncoder) """
+        self.client.send_dgram(dgram, key)
+
+    def set_policy(self, address: str, policy: int) -> None:
+        self.client.set_policy(address, policy)
+
+    def flush(self) -> None:
+        """ Send all messages bundled since the last flush (bundle mode) """
+        self.client.flush()
         
 
 
+def typed_encoder(cache: dict, address: str, typetag: str):
+    """ Cached encoder of an (address, typetag) pair (prepared message if fixed-size) """
+    key = (address, typetag)
+    encoder = cache.get(key)
+    if encoder is None:
+        if get_codec(typetag) is not None:
+            encoder = OscPreparedMessage(address, typetag)
+        else:
+            encoder = OscTypedEncoder(address, typetag)
+        cache[key] = encoder
+    return encoder
+
+def join_group(sock, group: str):
+    """ Join a multicast group (on the default interface) """
+    mreq = bytes([int(b) for b in group.split('.')]) + bytes(4)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+def load_host(path: str):
+    """ Last known host ({"host", "port"}) cached in flash, None if absent """
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        return cached if "host" in cached else None
+    except (OSError, ValueError):
+        return None
+
+def save_host(path: str, host: str, port: int):
+    """ Cache the host in flash (ignored if the file cannot be written) """
+    try:
+        with open(path, "w") as f:
+            json.dump({"host": host, "port": port}, f)
+    except OSError as e:
+        print("Could not cache host: %s"%e)
+
 # OSC decorator
 def osc_parse(func):
     '''decorates a python function to automatically transform args and kwargs coming from Max'''
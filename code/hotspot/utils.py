@@ -9,7 +9,25 @@
 
 """
 import math
-from machine import Timer
+import time
+
+#
+# Tick counters of MicroPython (emulated on CPython, for the host tools)
+#
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+    ticks_add = time.ticks_add
+except AttributeError:
+    def ticks_ms():
+        return time.perf_counter_ns() // 1000000
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+    def ticks_diff(a, b):
+        return a - b
+    def ticks_add(a, b):
+        return a + b
 
 def freq2midi(
         freq: float
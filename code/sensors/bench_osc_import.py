@@ -0,0 +1,35 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ bench_osc_import.py : Import cost of the OSC package
+
+ Measures the time taken by importing the message builder, and the heap
+ left afterwards (gc.mem_free on the board, traced allocations on a
+ computer). Must run in a fresh interpreter to be meaningful
+ (mpremote soft-reset + run bench_osc_import.py, or python bench_osc_import.py).
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import gc
+import sys
+from utils import ticks_us, ticks_diff
+
+gc.collect()
+if hasattr(gc, 'mem_free'):
+    free_before = gc.mem_free()
+else:
+    import tracemalloc
+    tracemalloc.start()
+start = ticks_us()
+from osc.osc_message_builder import OscMessageBuilder
+elapsed = ticks_diff(ticks_us(), start)
+gc.collect()
+print("import time     : %d us" % elapsed)
+if hasattr(gc, 'mem_free'):
+    print("free heap       : %d bytes (%d used by the import)" % (gc.mem_free(), free_before - gc.mem_free()))
+else:
+    print("allocated       : %d bytes" % tracemalloc.get_traced_memory()[0])
+print("datetime loaded : %s" % ('datetime' in sys.modules))
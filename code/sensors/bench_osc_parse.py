@@ -0,0 +1,117 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ bench_osc_parse.py : Differential check and benchmark of the OSC parsers
+
+ First checks that the zero-copy parser (osc_view) returns exactly the
+ same results as OscMessage on a corpus of valid, truncated and corrupted
+ datagrams, then compares their throughput on large multi-argument messages.
+ Runs on the board (mpremote run bench_osc_parse.py) or on a computer
+ (python bench_osc_parse.py, from this folder).
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import random
+from osc.osc_message import OscMessage
+from osc.osc_message_builder import OscMessageBuilder
+from osc.osc_view import OscMessageView
+from utils import ticks_us, ticks_diff
+
+n_random = 500      # Number of random messages in the differential corpus
+sizes = (4, 32, 256, 1024)
+
+def random_arg(depth = 0):
+    """ Random argument covering all the supported types """
+    kind = random.randint(0, 11 if depth == 0 else 10)
+    if kind == 0:
+        return random.randint(-2 ** 31, 2 ** 31 - 1), 'i'
+    if kind == 1:
+        return random.randint(-2 ** 63, 2 ** 63 - 1), 'h'
+    if kind == 2:
+        return random.random(), 'f'
+    if kind == 3:
+        return random.random(), 'd'
+    if kind == 4:
+        return 'x' * random.randint(0, 9), 's'
+    if kind == 5:
+        return bytes([random.randint(0, 255) for _ in range(random.randint(1, 9))]), 'b'
+    if kind == 6:
+        return random.randint(0, 2 ** 32 - 1), 'r'
+    if kind == 7:
+        return tuple(random.randint(0, 255) for _ in range(4)), 'm'
+    if kind == 8:
+        return True, 'T'
+    if kind == 9:
+        return False, 'F'
+    if kind == 10:
+        return None, 'N'
+    n = random.randint(0, 3)
+    values = [random_arg(1) for _ in range(n)]
+    return [v for v, _ in values], [t for _, t in values]
+
+def build(address, n_args):
+    builder = OscMessageBuilder(address)
+    for _ in range(n_args):
+        value, arg_type = random_arg()
+        builder.add_arg(value, arg_type)
+    return builder.build_dgram()
+
+def parse_reference(dgram):
+    try:
+        msg = OscMessage(dgram)
+        return msg.address, msg.params
+    except Exception as e:
+        return 'error'
+
+def parse_view(dgram):
+    try:
+        msg = OscMessageView(dgram)
+        return msg.address, msg.params
+    except Exception as e:
+        return 'error'
+
+def same(a, b):
+    """ Equality that also holds for NaN floats """
+    if isinstance(a, float) and isinstance(b, float) and a != a and b != b:
+        return True
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+def differential():
+    """ Compare both parsers, returns the number of datagrams checked """
+    random.seed(1234)
+    checked = 0
+    for k in range(n_random):
+        dgram = build('/sensor/' + 'a' * (k % 7), random.randint(0, 8))
+        corpus = [dgram, dgram[:random.randint(0, len(dgram))]]
+        corrupted = bytearray(dgram)
+        corrupted[random.randint(0, len(dgram) - 1)] = random.randint(0, 255)
+        corpus.append(bytes(corrupted))
+        for d in corpus:
+            ref, view = parse_reference(d), parse_view(d)
+            if not same(ref, view):
+                raise AssertionError('Parsers differ on %r: %r != %r' % (d, ref, view))
+            checked += 1
+    return checked
+
+def throughput(cls, dgram, n):
+    """ Messages parsed per second """
+    start = ticks_us()
+    for _ in range(n):
+        cls(dgram).params
+    return n * 1e6 / max(ticks_diff(ticks_us(), start), 1)
+
+print("Differential check: %d datagrams identical" % differential())
+print("%6s %8s %14s %14s" % ("args", "bytes", "OscMessage/s", "view/s"))
+for n_args in sizes:
+    builder = OscMessageBuilder('/sensor/block')
+    for k in range(n_args):
+        builder.add_arg(float(k) if k % 2 else k)
+    dgram = builder.build_dgram()
+    n = max(10, 2000 // n_args)
+    print("%6d %8d %14.0f %14.0f" % (n_args, len(dgram),
+        throughput(OscMessage, dgram, n), throughput(OscMessageView, dgram, n)))
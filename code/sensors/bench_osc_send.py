@@ -0,0 +1,73 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ bench_osc_send.py : Benchmark of the OSC send path
+
+ Compares the generic builder path (send_osc) against prepared messages
+ (send_prepared) in sends per second and bytes allocated per send.
+ Runs on the board (mpremote run bench_osc_send.py) or on a computer
+ (python bench_osc_send.py, from this folder).
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import gc
+import socket
+from udp import OSCClient
+from utils import ticks_us, ticks_diff
+
+n_sends = 2000      # Number of sends per measure
+address = "/sensor/light"
+
+def measure_rate(func, n):
+    """ Sends per second over n calls """
+    start = ticks_us()
+    for k in range(n):
+        func(k)
+    elapsed = ticks_diff(ticks_us(), start)
+    return n * 1e6 / max(elapsed, 1)
+
+def measure_alloc(func, n):
+    """ Bytes allocated per call (MicroPython) or peak bytes per call (CPython) """
+    gc.collect()
+    if hasattr(gc, 'mem_alloc'):
+        gc.disable()
+        before = gc.mem_alloc()
+        for k in range(n):
+            func(k)
+        after = gc.mem_alloc()
+        gc.enable()
+        return (after - before) / n
+    import tracemalloc
+    tracemalloc.start()
+    total = 0
+    for k in range(n):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        func(k)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / n
+
+# Local sink so that datagrams are actually delivered
+sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sink.bind(('127.0.0.1', 0))
+port = sink.getsockname()[1] if hasattr(sink, 'getsockname') else 2323
+client = OSCClient('127.0.0.1', port)
+msg = client.prepare(address, "iif")
+
+def send_builder(k):
+    client.send_osc(address, [5, 0, 0.5])
+
+def send_prepared(k):
+    client.send_prepared(msg, 5, 0, 0.5)
+
+print("%-10s %12s %12s" % ("path", "sends/s", "bytes/send"))
+for name, func in (("builder", send_builder), ("prepared", send_prepared)):
+    rate = measure_rate(func, n_sends)
+    alloc = measure_alloc(func, n_sends // 10)
+    print("%-10s %12.0f %12.1f" % (name, rate, alloc))
+client.close()
+sink.close()
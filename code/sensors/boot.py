@@ -10,11 +10,12 @@
 """
 import gc
 import json
-import socket
 import machine
 import utime as time
-from wifi import WiFi
-from udp import OSCManager
+from wifi import WiFi, GOT_IP
+from udp import OSCManager, Discovery, COALESCE
+from heartbeat import Heartbeat
+from policy import SendPolicy
 from utils import RingBuffer
 from buzzer import import_buzzer
 from screen import import_screen
@@ -22,6 +23,8 @@ from bare import PiezoDisc, FlexStrip
 from config import boards_sensors, sensor_dict, sensor_normalize
 from boards import board_dict
 from led import LEDStrip
+from osc.osc_block import OscBlockEncoder
+from osc.osc_compact import OscCompactEncoder, compact_sensor
 
 # Safety reset
 gc.collect()
@@ -34,7 +37,8 @@ refresh_ms = 5				# Global pause time between read
 # Select one meta-config
 cur_board = boards_sensors[b_id]
 config = cur_board["type"] + "_expansion"
-# Import corresponding JSON file from flash
+# Import corresponding JSON file from flash (the optional features are off,
+# see configs/esp32s3_expansion_full.json for a config enabling them)
 with open("configs/" + config + ".json") as f:
     config = json.load(f)
     print(config)
@@ -50,42 +54,24 @@ screen = import_screen(config, board)
 screen.refresh(b_name, b_type, b_status, ip_in = "", ip_out = "", values = "")
 # Create a buzzer if present
 buzzer = import_buzzer(config, board)
-# Initialize network settings
+# Initialize network settings (the connection is handled from the main loop)
+wifi = None
+osc = None
+discovery = None
+wifi_up = False
+link_up = False
+ip = " Off."
+ip_out = " Off."
 if (b_online):
     screen.refresh(b_name, b_type, "Connecting ...")
-    wifi = WiFi(
-        ssid = wifi_config["networks"][0]["ssid"],
-        password = wifi_config["networks"][0]["password"],
-        scan = False)
-    # Connect to the WiFi
-    wifi.connect()
-    # Retrieve the IP
-    ip = wifi.ip()
-    screen.refresh(b_name, b_type, "Connected.", ip_in = ip, ip_out = "", values = "")
-    # Create a keep alive socket (hotspot)
-    alive_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    alive_dest = ('192.168.4.1', 16841)
-    # Send an alive message
-    alive_sock.sendto(str(b_id).encode(), alive_dest)
-    # Infer board IP
-    board_id = ip.split(".")[-1]
-    # Create a UDP/OSC client and server
-    screen.refresh(b_name, b_type, "OSC Discover ...", ip_in = ip, ip_out = "", values = "")
-    osc = OSCManager(
-        host = config["osc"]["host"],
-        in_port = config["osc"]["in_port"],
-        out_port = config["osc"]["out_port"],
-        bc_port = config["osc"]["bc_port"],
-        discovery = config["discovery"])
-    ip_out = osc.host
-    screen.refresh(b_name, b_type, "OSC Found.", ip_in = ip, ip_out = ip_out, values = "")
-    # Send a connection message to live
-    board_type = cur_board["type"]
-    sensors_list = " ".join([f"{i}:{t[0]}" for i, t in enumerate(cur_board["sensors"])])
-    osc.send_osc("/connect", [b_id, board_type, sensors_list])
-else:
-    ip = " Off."
-    ip_out = " Off."
+    wifi = WiFi(config = wifi_config)
+    # Create the keep alive scheduler (hotspot)
+    alive_config = config.get("alive", {})
+    heartbeat = Heartbeat(b_id,
+        host = alive_config.get("host", "192.168.4.1"),
+        port = alive_config.get("port", 16841),
+        interval_ms = alive_config.get("interval_ms", 1000),
+        max_interval_ms = alive_config.get("max_interval_ms", 5000))
 # Handle potential LED strip
 if (cur_board["light"]):
     strip = LEDStrip(cur_board["light"]["pin"], cur_board["light"]["n_leds"])
@@ -104,12 +90,161 @@ for i, s in enumerate(cur_board["sensors"]):
         sensors[i] = sensor_dict[s[0]][0](pin_sda = s[1], pin_scl = s[2])
         continue
     sensors[i] = sensor_dict[s[0]][0](pin = s[1])
+# OSC message of each sensor (prepared once online, filled in place)
+osc_msgs = [None] * len(cur_board["sensors"])
+# Compact mode: values quantised on 8 or 16 bits, packed with the board and sensor ids
+compact = None
+if (config["osc"].get("compact", 0)):
+    compact = OscCompactEncoder(bits = config["osc"]["compact"])
+# Number of axes of the (list) values of a sensor type
+def sensor_axes(s_type: str) -> int:
+    return 3 if (s_type == "gyroscope") else 1
+# Block mode: raw samples of high-rate sensors sent by blocks of N (as a blob). The
+# "blocks" entry of a sensor type is either N or {"size": N, "type": "h", "H" or "f"}
+# (default "H", "f" for list values). List values are sent as one block per axis,
+# with the axis as sensor index (as their values).
+blocks = [None] * len(cur_board["sensors"])
+# End time of the last block of each sensor (measured sampling rate)
+block_last = [None] * len(cur_board["sensors"])
+block_config = cur_board.get("blocks", {})
+if (b_online):
+    for i, s in enumerate(cur_board["sensors"]):
+        if (s[0] not in block_config):
+            continue
+        entry = block_config[s[0]]
+        if (not isinstance(entry, dict)):
+            entry = {"size": entry}
+        axes = sensor_axes(s[0])
+        blocks[i] = [OscBlockEncoder(
+                "/block/" + sensor_dict[s[0]][1],
+                n_samples = entry["size"],
+                sample_type = entry.get("type", "f" if axes > 1 else "H"),
+                board = b_id,
+                sensor = j if axes > 1 else i,
+                rate = 1000 // refresh_ms) for j in range(axes)]
+# Stream a raw reading by blocks
+def send_blocks(i: int, raw_val):
+    """ Append a raw reading of sensor i to its blocks (one per axis), send them when full """
+    samples = raw_val if (len(blocks[i]) > 1) else (raw_val,)
+    full = False
+    for block, sample in zip(blocks[i], samples):
+        full = block.append(sample)
+    if (not full):
+        return
+    # Actual sampling rate over the block (the loop period varies)
+    now = time.ticks_ms()
+    if (block_last[i] is not None):
+        elapsed = max(1, time.ticks_diff(now, block_last[i]))
+        for block in blocks[i]:
+            block.set_rate((block.n_samples * 1000 + elapsed // 2) // elapsed)
+    block_last[i] = now
+    if (link_up):
+        for block in blocks[i]:
+            osc.send_dgram(block.dgram)
+# Send a value (compact or full message)
+def send_value(i: int, value: float, axis: int = None):
+    """ Send a normalised value of sensor i, or of an axis of its list value """
+    if (compact is not None):
+        osc.send_dgram(compact.pack(b_id, compact_sensor(i, axis or 0), value))
+    else:
+        osc.send_prepared(osc_msgs[i], b_id, i if axis is None else axis, value)
+
+# Fleet-wide control handlers
+def fleet_rate(address, *args):
+    """ Set the pause between two reads (/fleet/rate ms), ignores invalid messages """
+    global refresh_ms
+    if (len(args) != 1 or not isinstance(args[0], (int, float))):
+        return
+    refresh_ms = max(1, min(int(args[0]), 10000))
+
+def fleet_resync(address, *args):
+    """ Restart the clock synchronisation (/fleet/resync) """
+    if (osc.clock is not None):
+        osc.clock.resync()
+
+# Transmission policy of each sensor (per type, or default)
+policies_config = config.get("policies", {})
+policies = [None] * len(cur_board["sensors"])
+for i, s in enumerate(cur_board["sensors"]):
+    policies[i] = policies_config.get(s[0], policies_config.get("default", {}))
+def sensor_policy(i: int, j: int = 0) -> SendPolicy:
+    """ Policy of a sensor value (one per axis for list values) """
+    if (isinstance(policies[i], dict)):
+        policies[i] = [SendPolicy(**policies[i])]
+    while (len(policies[i]) <= j):
+        policies[i].append(SendPolicy(**policies_config.get(cur_board["sensors"][i][0], policies_config.get("default", {}))))
+    return policies[i][j]
+def suppressed_sends() -> int:
+    """ Values not sent by the policies (reported in /stats) """
+    return sum([sum([p.suppressed for p in ps]) for ps in policies if isinstance(ps, list)])
 # Clean garbage
 gc.collect()
 # ------------
 # Main loop
 # ------------
 while True:
+    # Advance the WiFi connection (non-blocking), sending pauses while offline
+    if (wifi is not None and wifi.tick()):
+        wifi_up = (wifi.state == GOT_IP)
+        b_status = wifi.state_name()
+        ip = wifi.ip() if wifi_up else " Off."
+        screen.refresh(b_name, b_type, b_status, ip_in = ip, ip_out = ip_out, values = "")
+        if (wifi_up):
+            # Send an alive message
+            heartbeat.send()
+        if (wifi_up and osc is None and config["discovery"] and discovery is None):
+            screen.refresh(b_name, b_type, "OSC Discover ...", ip_in = ip, ip_out = "", values = "")
+            discovery = Discovery(
+                bc_port = config["osc"]["bc_port"],
+                b_id = b_id,
+                out_port = config["osc"]["out_port"],
+                group = wifi_config.get("broadcast", {}).get("group", ""),
+                group_port = wifi_config.get("broadcast", {}).get("port", 5007))
+    # Find the host (one bounded step per iteration), then create the OSC client and server
+    if (wifi_up and osc is None):
+        host = config["osc"]["host"]
+        if (discovery is not None):
+            host = discovery.tick()
+        if (host is not None):
+            discovery = None
+            osc = OSCManager(
+                host = host,
+                in_port = config["osc"]["in_port"],
+                out_port = config["osc"]["out_port"],
+                bc_port = config["osc"]["bc_port"],
+                discovery = 0,
+                bundle_size = config["osc"].get("bundle_size", 0),
+                sync_port = config["osc"].get("sync_port", 0),
+                b_id = b_id,
+                queue_slots = config["osc"].get("queue_slots", 0),
+                rate = config["osc"].get("rate", 0),
+                group = wifi_config.get("broadcast", {}).get("group", ""),
+                group_port = wifi_config.get("broadcast", {}).get("port", 5007),
+                seq = config["osc"].get("seq", 0),
+                stats_ms = config["osc"].get("stats_ms", 0),
+                stream_port = config["osc"].get("stream_port", 0))
+            # Fleet-wide control (multicast)
+            osc.map("/fleet/rate", fleet_rate)
+            osc.map("/fleet/resync", fleet_resync)
+            osc.suppressed = suppressed_sends
+            # Addresses for which only the latest pending message matters
+            for address in config["osc"].get("coalesce", []):
+                osc.set_policy(address, COALESCE)
+            ip_out = osc.host
+            # Data sent to the hotspot itself also counts as keep alive
+            data_alive = (osc.host == heartbeat.dest[0])
+            data_sent = 0
+            screen.refresh(b_name, b_type, "OSC Found.", ip_in = ip, ip_out = ip_out, values = "")
+            # Send a connection message to live (reliably, and at each reconnection, with a stream port)
+            board_type = cur_board["type"]
+            # (index:type:name, with the number of axes of list values, see host/compact_decoder.py)
+            sensors_list = " ".join([f"{i}:{t[0]}:{sensor_dict[t[0]][1]}" + (f":{sensor_axes(t[0])}" if sensor_axes(t[0]) > 1 else "")
+                for i, t in enumerate(cur_board["sensors"])])
+            osc.send_control("/connect", "iss", b_id, board_type, sensors_list, hello = True)
+            # Prepare the OSC message of each sensor
+            for i, s in enumerate(cur_board["sensors"]):
+                osc_msgs[i] = osc.prepare("/sensor/" + sensor_dict[s[0]][1], "iif")
+    link_up = wifi_up and osc is not None
     values = [0] * len(sensors)
     # Parse through all sensors
     for i in range(len(sensors)):
@@ -117,27 +252,32 @@ while True:
         raw_val = sensors[i].read()
         # Fill the buffer
         buffers[i].append(raw_val)
+        # Stream raw samples by blocks
+        if (blocks[i] is not None):
+            send_blocks(i, raw_val)
         # Apply sensor-specific preprocessing function
         proc_val = sensor_dict[cur_board["sensors"][i][0]][2](buffers[i])
         # Handle list values
         if (cur_board["sensors"][i][0] == "gyroscope"):
             for j, vA in enumerate(proc_val):
                 normA = sensor_normalize(vA + 2.0, cur_board["sensors"][i][0])
-                if (b_online):
-                    osc.send_osc("/sensor/" + sensor_dict[cur_board["sensors"][i][0]][1], [b_id, j, normA])
+                if (link_up and blocks[i] is None and sensor_policy(i, j).should_send(normA)):
+                    send_value(i, normA, j)
                 final_val = normA
         else:
             final_val = sensor_normalize(proc_val, cur_board["sensors"][i][0])
-            # Thresholding value for accounting the value
-            if (final_val <= 0.):
-                continue
-            if (b_online):
-                # Send current value to OSC
-                osc.send_osc("/sensor/" + sensor_dict[cur_board["sensors"][i][0]][1], [b_id, i, final_val])
+            if (link_up and blocks[i] is None and sensor_policy(i).should_send(final_val)):
+                # Send current value to OSC (only if it changed enough)
+                send_value(i, final_val)
         print(f'{str(sensors[i].__class__)[13:-2]:14s}: {final_val:3.3f}')
         values[i] = final_val
+    # Send all values of this iteration as one bundle
+    if (link_up):
+        osc.flush()
+        # Handle incoming control messages (non-blocking)
+        osc.poll()
     # Prepare output value
-    screen.refresh(b_name, b_type, "Sending.", ip_in = ip, ip_out = ip_out, values = "%.2f"%(final_val))
+    screen.refresh(b_name, b_type, "Sending." if link_up else b_status, ip_in = ip, ip_out = ip_out, values = "%.2f"%(final_val))
     # Update lights
     time.sleep_ms(refresh_ms)
     # Garbage collect
@@ -146,6 +286,11 @@ while True:
         if (cur_board["light"]["mode"] == "continuous"):
             strip.update_color(values[cur_board["light"]["color"]])
             strip.update_intensity(values[cur_board["light"]["intensity"]] ** 4)
-    # Send the keep-alive message
-    if (b_online):
-        alive_sock.sendto(str(b_id).encode(), alive_dest)
+    # Send the keep-alive message (if no data reached the hotspot)
+    if (link_up):
+        if (data_alive):
+            sent = osc.client.stats()[0]
+            if (sent != data_sent):
+                heartbeat.touch()
+                data_sent = sent
+        heartbeat.tick()
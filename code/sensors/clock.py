@@ -0,0 +1,189 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ clock.py : Board-to-host clock synchronisation (NTP-style, over OSC)
+
+ The board periodically sends /sync/ping (board id, local time in us) to
+ the host, which answers /sync/pong (board id, echoed local time, host
+ receive and transmit NTP timetags). From the four timestamps, each
+ exchange gives an offset and a round-trip delay estimate. The offset of
+ the exchange with the smallest delay in a window is kept, and a linear fit
+ over the last windows gives the drift of the local clock. The estimated host clock is
+ then available as NTP timetags for the send path (bundle timetags).
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+from osc import ntp
+from osc.osc_prepared import OscPreparedMessage
+from utils import ticks_us, ticks_diff
+
+_US_PER_S = 1000000
+_UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+
+def timetag_to_us(timetag: int) -> int:
+    """ Convert a 64-bit NTP timetag to microseconds since the NTP epoch """
+    seconds, fraction = ntp.parse_timestamp(timetag & _UINT64_MASK)
+    return seconds * _US_PER_S + ((fraction * _US_PER_S) >> 32)
+
+def us_to_timetag(us: int) -> int:
+    """ Convert microseconds since the NTP epoch to a 64-bit NTP timetag """
+    seconds = us // _US_PER_S
+    fraction = ((us - seconds * _US_PER_S) << 32) // _US_PER_S
+    return (seconds << 32) | fraction
+
+class LocalClock:
+    """
+    Monotonic microsecond clock that does not wrap.
+    The hardware ticks wrap around (every ~18 min on ESP32), so elapsed ticks
+    are accumulated into an unbounded integer at each call.
+    """
+
+    def __init__(self):
+        self.last = ticks_us()
+        self.total = 0
+
+    def now_us(self) -> int:
+        """ Microseconds elapsed since the creation of the clock """
+        cur = ticks_us()
+        self.total += ticks_diff(cur, self.last)
+        self.last = cur
+        return self.total
+
+class ClockSync:
+    """
+    Estimation of the host clock (offset and drift) from ping / pong exchanges.
+
+    Example :
+    >>> clock = ClockSync(b_id, send = lambda dgram: sock.sendto(dgram, dest))
+    >>> dispatcher.map("/sync/pong", clock.handle_pong)
+    >>> clock.tick() # From the main loop, sends pings when needed
+    >>> clock.now_timetag() # Current host time as an NTP timetag
+    """
+
+    def __init__(self,
+            b_id: int,
+            send = None,
+            interval_ms: int = 10000,
+            burst: int = 8,
+            burst_ms: int = 50):
+        """
+        Args:
+            b_id: Board identifier (echoed by the host)
+            send: Function sending a datagram to the host sync port
+            interval_ms: Time between two synchronisation windows
+            burst: Number of pings per window
+            burst_ms: Time between two pings of a window
+        """
+        self.b_id = b_id
+        self.send = send
+        self.interval_us = interval_ms * 1000
+        self.burst = burst
+        self.burst_us = burst_ms * 1000
+        self.local = LocalClock()
+        self.ping = OscPreparedMessage("/sync/ping", "ih")
+        # Current window (number of pings sent, best exchange)
+        self.sent = 0
+        self.last_ping = None
+        self.best_delay = None
+        self.best_offset = 0
+        self.best_local = 0
+        # Estimate (offset at reference local time, drift in parts per billion)
+        self.synced = False
+        self.offset = 0
+        self.ref = 0
+        self.drift_ppb = 0
+        self.history = []
+        self.max_history = 8
+        # Oscillators are within +-500 ppm, anything beyond is noise
+        self.max_drift_ppb = 500000
+        # Statistics
+        self.windows = 0
+        self.pongs = 0
+        self.delay = 0
+        self.errors = 0
+
+    def resync(self):
+        """ Drop the estimate history and start a new window right away """
+        self.history = []
+        self.drift_ppb = 0
+        self.best_delay = None
+        self.sent = 0
+        self.last_ping = None
+
+    def tick(self):
+        """ Send a ping if one is due (to be called from the main loop) """
+        now = self.local.now_us()
+        if self.sent >= self.burst:
+            # Window complete: integrate it once the last pong had time to arrive
+            if self.best_delay is not None and now - self.last_ping >= self.burst_us:
+                self.update()
+            if now - self.last_ping < self.interval_us:
+                return
+            self.sent = 0
+        elif self.last_ping is not None and now - self.last_ping < self.burst_us:
+            return
+        self.last_ping = now
+        self.sent += 1
+        if self.send is not None:
+            try:
+                self.send(self.ping.pack(self.b_id, now))
+            except OSError:
+                # Driver buffer full (EAGAIN, ENOMEM): the ping is lost
+                self.errors += 1
+
+    def handle_pong(self, address: str, b_id: int, t1: int, t2: int, t3: int):
+        """ Handler of /sync/pong (board id, local send, host receive, host send) """
+        t4 = self.local.now_us()
+        if b_id != self.b_id:
+            return
+        t2 = timetag_to_us(t2)
+        t3 = timetag_to_us(t3)
+        delay = (t4 - t1) - (t3 - t2)
+        offset = ((t2 - t1) + (t3 - t4)) // 2
+        self.pongs += 1
+        if self.best_delay is None or delay < self.best_delay:
+            self.best_delay = delay
+            self.best_offset = offset
+            self.best_local = t4
+        if not self.synced:
+            # First estimate, refined at the end of the window
+            self.offset = offset
+            self.ref = t4
+            self.synced = True
+
+    def update(self):
+        """ Integrate the best exchange of the window into the estimate """
+        if self.best_delay is None:
+            return
+        # Drift is the least-squares slope of the offsets of the last windows
+        self.history.append((self.best_local, self.best_offset))
+        if len(self.history) > self.max_history:
+            self.history.pop(0)
+        if len(self.history) > 2:
+            n = len(self.history)
+            mean_t = sum([t for t, _ in self.history]) // n
+            mean_o = sum([o for _, o in self.history]) // n
+            num = sum([(t - mean_t) * (o - mean_o) for t, o in self.history])
+            den = sum([(t - mean_t) ** 2 for t, _ in self.history])
+            if den > 0:
+                drift = (num * 1000000000) // den
+                self.drift_ppb = max(-self.max_drift_ppb, min(self.max_drift_ppb, drift))
+        self.offset = self.best_offset
+        self.ref = self.best_local
+        self.delay = self.best_delay
+        self.best_delay = None
+        self.windows += 1
+
+    def now_us(self) -> int:
+        """ Estimated host time, in microseconds since the NTP epoch """
+        local = self.local.now_us()
+        return local + self.offset + ((local - self.ref) * self.drift_ppb) // 1000000000
+
+    def now_timetag(self) -> int:
+        """ Estimated host time as a 64-bit NTP timetag (immediately if not synced yet) """
+        if not self.synced:
+            return ntp.TIMETAG_IMMEDIATELY
+        return us_to_timetag(self.now_us())
@@ -0,0 +1,86 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ heartbeat.py : Keep-alive messages between the boards and the hotspot
+
+ A heartbeat is a 2-byte datagram (magic byte, board id) sent to the hotspot
+ when no other traffic reached it during the heartbeat interval, and at
+ least every max interval anyway (so that a rebooted hotspot learns the IP
+ of the board again, see alive_timeout on the hotspot). The hotspot
+ recognises it with a single comparison (see parse_heartbeat), without any
+ string decoding.
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+import socket
+from utils import ticks_ms, ticks_diff
+
+# First byte of a heartbeat (not a valid start of OSC, decimal or 'live')
+HEARTBEAT_MAGIC = 0xA5
+
+def parse_heartbeat(dgram, length: int = None) -> int:
+    """ Board id of a heartbeat datagram, -1 if it is not a heartbeat """
+    if length is None:
+        length = len(dgram)
+    if length != 2 or dgram[0] != HEARTBEAT_MAGIC:
+        return -1
+    return dgram[1]
+
+class Heartbeat:
+    """
+    Scheduler of the keep-alive messages of a board.
+    The explicit heartbeat is skipped whenever traffic was sent to the
+    hotspot during the interval (see touch), but never for longer than
+    max_interval_ms.
+
+    Example :
+    >>> heartbeat = Heartbeat(b_id, interval_ms = 1000)
+    >>> heartbeat.touch() # When data was sent to the hotspot
+    >>> heartbeat.tick() # From the main loop
+    """
+
+    def __init__(self,
+            b_id: int,
+            host: str = '192.168.4.1',
+            port: int = 16841,
+            interval_ms: int = 1000,
+            max_interval_ms: int = 5000):
+        self.dest = (host, port)
+        self.interval_ms = interval_ms
+        self.max_interval_ms = max(interval_ms, max_interval_ms)
+        self.payload = bytes([HEARTBEAT_MAGIC, b_id])
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.last = ticks_ms()
+        self.last_sent = self.last
+        # Statistics
+        self.sent = 0
+        self.errors = 0
+
+    def touch(self):
+        """ Notify that traffic reached the hotspot (no heartbeat needed) """
+        self.last = ticks_ms()
+
+    def send(self):
+        """ Send a heartbeat right away """
+        self.last = self.last_sent = ticks_ms()
+        try:
+            self.sock.sendto(self.payload, self.dest)
+            self.sent += 1
+        except OSError:
+            self.errors += 1
+
+    def tick(self):
+        """ Send a heartbeat if the interval elapsed without traffic (or the max interval) """
+        now = ticks_ms()
+        if (ticks_diff(now, self.last) >= self.interval_ms
+                or ticks_diff(now, self.last_sent) >= self.max_interval_ms):
+            self.send()
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
@@ -1,10 +1,17 @@
-"""Parsing and conversion of NTP dates contained in datagrams."""
+"""Parsing and conversion of NTP dates contained in datagrams.
+
+Timetags are handled as integer 32.32 fixed-point seconds since 1900, so
+that no float (single precision on most boards) nor datetime is involved.
+The datetime module is only imported when a calendar conversion is asked.
+"""
 
-import datetime
 import struct
 import time
 
-from ucollections import namedtuple
+try:
+    from ucollections import namedtuple
+except ImportError:
+    from collections import namedtuple
 
 # 63 zero bits followed by a one in the least signifigant bit is a special
 # case meaning "immediately."
@@ -14,11 +21,26 @@ IMMEDIATELY = struct.pack('>Q', 1)
 _NTP_TIMESTAMP_TO_SECONDS = 1. / 2. ** 32.
 _SECONDS_TO_NTP_TIMESTAMP = 2. ** 32.
 
-# From NTP lib.
-_SYSTEM_EPOCH = datetime.date(*time.gmtime(0)[0:3])
-_NTP_EPOCH = datetime.date(1900, 1, 1)
-# _NTP_DELTA is 2208988800
-_NTP_DELTA = (_SYSTEM_EPOCH - _NTP_EPOCH).days * 24 * 3600
+# Integer timetag meaning "immediately".
+TIMETAG_IMMEDIATELY = 1
+
+
+def _ntp_delta() -> int:
+    """Seconds between the NTP epoch (1900) and the system epoch.
+
+    The system epoch is 1970 on CPython and most ports, but 2000 on
+    some MicroPython ports.
+    """
+    epoch = time.gmtime(0)
+    days = epoch[7] - 1
+    for year in range(1900, epoch[0]):
+        days += 366 if (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)) else 365
+    return days * 24 * 3600 + epoch[3] * 3600 + epoch[4] * 60 + epoch[5]
+
+
+# _NTP_DELTA is 2208988800 for a 1970 system epoch.
+_NTP_DELTA = _ntp_delta()
+_NANOSECONDS = 1000000000
 
 
 Timestamp = namedtuple('Timestamp', ('seconds','fraction'))
@@ -66,3 +88,42 @@ def system_time_to_ntp_epoch(seconds: float) -> float:
     """Convert a system time in seconds to NTP time in seconds.
     """
     return seconds + _NTP_DELTA
+
+
+def system_time_to_timetag(seconds) -> int:
+    """Convert a system time in (integer or float) seconds to a NTP timetag.
+    """
+    whole = int(seconds)
+    fraction = int((seconds - whole) * _SECONDS_TO_NTP_TIMESTAMP)
+    return ((whole + _NTP_DELTA) << 32) + fraction
+
+
+def timetag_to_system_time(timetag: int) -> float:
+    """Convert a NTP timetag to a system time in seconds.
+    """
+    seconds, fraction = parse_timestamp(timetag)
+    return (seconds - _NTP_DELTA) + fraction * _NTP_TIMESTAMP_TO_SECONDS
+
+
+def now_timetag() -> int:
+    """Current system time as a NTP timetag (nanosecond resolution if available).
+    """
+    try:
+        ns = time.time_ns()
+    except AttributeError:
+        return (int(time.time()) + _NTP_DELTA) << 32
+    seconds = ns // _NANOSECONDS
+    fraction = ((ns - seconds * _NANOSECONDS) << 32) // _NANOSECONDS
+    return ((seconds + _NTP_DELTA) << 32) | fraction
+
+
+def timetag_to_datetime(timetag: int):
+    """Convert a NTP timetag to a (naive, utc) datetime.
+
+    This is the only conversion relying on the datetime module, which is
+    imported on demand.
+    """
+    from datetime import datetime, timedelta
+    seconds, fraction = parse_timestamp(timetag)
+    return (datetime(1900, 1, 1) +
+            timedelta(seconds=seconds, microseconds=(fraction * 1000000) >> 32))
@@ -0,0 +1,120 @@
+"""Block streaming of sensor samples as OSC blobs.
+
+Instead of one OSC message per sample, consecutive samples of a sensor are
+packed into a single blob (int16, uint16 or float32, big-endian). A block
+message carries the board id, the sensor index, the sample rate (Hz) and
+the index of its first sample, so that the host can place every sample in
+time, followed by the struct code of the samples and the blob itself.
+"""
+
+import struct
+
+from osc import osc_types
+
+# Supported sample types (struct codes) and their size in bytes.
+SAMPLE_TYPES = {'h': 2, 'H': 2, 'f': 4}
+# Type tag of a block message: board id, sensor index, sample rate,
+# index of the first sample, sample type (as an int) and samples.
+BLOCK_TYPETAG = ',iiiiib'
+# Size of the integer fields preceding the blob.
+_FIELDS_LEN = 20
+
+
+class OscBlockEncoder(object):
+    """Packs consecutive samples of a sensor into one preallocated message.
+
+    Samples are written straight into the datagram, so that a full block
+    can be sent without any allocation.
+    """
+
+    def __init__(self,
+            address: str,
+            n_samples: int,
+            sample_type: str = 'H',
+            board: int = 0,
+            sensor: int = 0,
+            rate: int = 0) -> None:
+        """Allocate the block message.
+
+        Args:
+          - address: The osc address to send blocks to.
+          - n_samples: Number of samples per block.
+          - sample_type: Struct code of the samples ('h', 'H' or 'f').
+          - board: Board identifier.
+          - sensor: Sensor index on the board.
+          - rate: Sampling rate in Hz.
+        Raises:
+          - ValueError: if the sample type is not supported.
+        """
+        if sample_type not in SAMPLE_TYPES:
+            raise ValueError('Sample type must be one of {}'.format(tuple(SAMPLE_TYPES)))
+        if n_samples < 1:
+            raise ValueError('Blocks need at least one sample')
+        header = osc_types.write_string(address) + osc_types.write_string(BLOCK_TYPETAG)
+        blob_len = n_samples * SAMPLE_TYPES[sample_type]
+        self.n_samples = n_samples
+        self.count = 0
+        self.index = 0
+        self._fmt = '>' + sample_type
+        self._sample_size = SAMPLE_TYPES[sample_type]
+        self._fields = len(header)
+        self._samples = self._fields + _FIELDS_LEN + 4
+        self._buffer = bytearray(self._samples + blob_len + (-blob_len % 4))
+        self._buffer[:self._fields] = header
+        struct.pack_into('>iiiii', self._buffer, self._fields,
+                         board, sensor, rate, 0, ord(sample_type))
+        osc_types.write_blob_into(self._buffer, self._fields + _FIELDS_LEN, bytes(blob_len))
+
+    def append(self, value) -> bool:
+        """Write one sample in place.
+
+        Returns:
+          - True when the block is full (and the datagram ready to be sent).
+        Raises:
+          - BuildError: if the value does not fit the sample type.
+        """
+        if self.count == self.n_samples:
+            self.count = 0
+        if self.count == 0:
+            # Index of the first sample of this block.
+            struct.pack_into('>i', self._buffer, self._fields + 12, self.index & 0x7FFFFFFF)
+        try:
+            struct.pack_into(self._fmt, self._buffer,
+                             self._samples + self.count * self._sample_size, value)
+        except (struct.error, TypeError, OverflowError) as e:
+            raise osc_types.BuildError('Wrong sample value passed: {}'.format(e))
+        self.count += 1
+        self.index += 1
+        return self.count == self.n_samples
+
+    def set_rate(self, rate: int) -> None:
+        """Set the sampling rate (Hz) written in the block."""
+        struct.pack_into('>i', self._buffer, self._fields + 8, int(rate))
+
+    @property
+    def dgram(self) -> bytearray:
+        """Returns the datagram of the current block."""
+        return self._buffer
+
+
+def decode_block(params):
+    """Decode the arguments of a block message.
+
+    Args:
+      params: The parameters of a parsed block message.
+
+    Returns:
+      A tuple (board, sensor, rate, first_index, samples).
+
+    Raises:
+      ValueError if the arguments are not those of a block message.
+    """
+    if len(params) != 6:
+        raise ValueError('A block message has 6 arguments, got {}'.format(len(params)))
+    board, sensor, rate, first_index, code, blob = params
+    sample_type = chr(code)
+    if sample_type not in SAMPLE_TYPES:
+        raise ValueError('Unknown sample type {}'.format(sample_type))
+    n_samples = len(blob) // SAMPLE_TYPES[sample_type]
+    samples = list(struct.unpack('>%d%s' % (n_samples, sample_type), blob))
+    return board, sensor, rate, first_index, samples
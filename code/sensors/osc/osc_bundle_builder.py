@@ -0,0 +1,157 @@
+"""Build OSC bundles for client applications."""
+
+import struct
+
+from osc import ntp
+from osc import osc_bundle
+from osc import osc_types
+
+# Shortcut to specify an immediate execution of messages in the bundle.
+IMMEDIATELY = osc_types.IMMEDIATELY
+
+# Bundle header (prefix and timetag) and element size prefix, in bytes.
+_HEADER_LEN = 16
+_ELEMENT_SIZE_LEN = 4
+
+
+class BuildError(Exception):
+    """Error raised when an error occurs building the bundle."""
+
+
+class OscBundleBuilder(object):
+    """Builds arbitrary OscBundle instances."""
+
+    def __init__(self, timestamp = IMMEDIATELY, timetag: int = None) -> None:
+        """Build a new bundle with the associated timestamp.
+
+        Args:
+          - timestamp: system time in seconds, or IMMEDIATELY if the
+                       contents must be handled as soon as they are received.
+          - timetag: integer NTP timetag, used instead of the timestamp
+                     when given (no float conversion).
+        """
+        self._timestamp = timestamp
+        self._timetag = timetag
+        self._contents = []
+
+    def add_content(self, content) -> None:
+        """Add a new content to this bundle.
+
+        Args:
+          - content: Either an OscBundle, an OscMessage or a raw datagram.
+        """
+        self._contents.append(content)
+
+    def build_dgram(self) -> bytes:
+        """Encodes the bundle as a raw datagram.
+
+        Raises:
+          - BuildError: if the bundle could not be built.
+        """
+        try:
+            if self._timetag is not None:
+                date = osc_types.write_ntp_timetag(self._timetag)
+            else:
+                date = osc_types.write_date(self._timestamp)
+            dgram = [osc_bundle._BUNDLE_PREFIX, date]
+            for content in self._contents:
+                if not isinstance(content, (bytes, bytearray)):
+                    content = content.dgram
+                dgram.append(osc_types.write_int(len(content)))
+                dgram.append(content)
+            return b''.join(dgram)
+        except osc_types.BuildError as be:
+            raise BuildError('Could not build the bundle {}'.format(be))
+
+    def build(self) -> osc_bundle.OscBundle:
+        """Build an OscBundle with the current state of this builder.
+
+        Raises:
+          - BuildError: if the bundle could not be built.
+        """
+        return osc_bundle.OscBundle(self.build_dgram())
+
+
+class OscBundleWriter(object):
+    """Accumulates raw datagrams into a preallocated bundle buffer.
+
+    Elements are copied in place into a single bytearray of a fixed maximum
+    size, so that a whole set of messages can be sent as one datagram
+    without any intermediate allocation.
+    """
+
+    def __init__(self, max_size: int = 1400, timetag: int = ntp.TIMETAG_IMMEDIATELY) -> None:
+        """Allocate the bundle buffer.
+
+        Args:
+          - max_size: Maximum size of the bundle datagram, in bytes.
+          - timetag: Initial NTP timetag of the bundle (see reset).
+        """
+        if max_size < _HEADER_LEN + _ELEMENT_SIZE_LEN:
+            raise BuildError('Bundle maximum size is too small')
+        self._buffer = bytearray(max_size)
+        self._view = memoryview(self._buffer)
+        self._buffer[:len(osc_bundle._BUNDLE_PREFIX)] = osc_bundle._BUNDLE_PREFIX
+        self._size = _HEADER_LEN
+        self._count = 0
+        self.reset(timetag)
+
+    def reset(self, timetag: int = ntp.TIMETAG_IMMEDIATELY) -> None:
+        """Empty the bundle and set its timetag.
+
+        Args:
+          - timetag: integer NTP timetag (see set_timetag).
+        """
+        self.set_timetag(timetag)
+        self._size = _HEADER_LEN
+        self._count = 0
+
+    def set_timetag(self, timetag: int) -> None:
+        """Set the timetag of the bundle as a raw 64-bit NTP timetag.
+
+        Args:
+          - timetag: NTP timetag (seconds since 1900 in the 32 high bits,
+                     fraction of second in the 32 low bits), 1 meaning
+                     immediately.
+        """
+        struct.pack_into('>Q', self._buffer, 8, timetag)
+
+    def fits(self, length: int) -> bool:
+        """Returns whether an element of the given length fits in the bundle."""
+        return self._size + _ELEMENT_SIZE_LEN + length <= len(self._buffer)
+
+    def add(self, dgram) -> bool:
+        """Copy a message (or bundle) datagram as a new element.
+
+        Returns:
+          - False (and leaves the bundle unchanged) if the element does not fit.
+        """
+        length = len(dgram)
+        if not self.fits(length):
+            return False
+        struct.pack_into('>i', self._buffer, self._size, length)
+        start = self._size + _ELEMENT_SIZE_LEN
+        self._view[start:start + length] = dgram
+        self._size = start + length
+        self._count += 1
+        return True
+
+    @property
+    def num_contents(self) -> int:
+        """Returns the number of elements currently in the bundle."""
+        return self._count
+
+    @property
+    def size(self) -> int:
+        """Returns the current length of the bundle datagram."""
+        return self._size
+
+    @property
+    def max_size(self) -> int:
+        """Returns the maximum length of the bundle datagram."""
+        return len(self._buffer)
+
+    @property
+    def dgram(self) -> memoryview:
+        """Returns a view on the current bundle datagram."""
+        return self._view[:self._size]
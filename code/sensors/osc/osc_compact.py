@@ -0,0 +1,120 @@
+"""Compact encoding of normalised sensor values as 32-bit words.
+
+The board id (8 bits), the sensor index (7 bits), a precision flag (1 bit)
+and the value in [0, 1] quantised on 8 or 16 bits are packed into a single
+32-bit word, sent as an 'r' (unsigned) or 'i' (signed) OSC argument:
+
+    | board (31-24) | sensor (23-17) | wide (16) | value (15-0) |
+
+The sensor field holds both the sensor index and the axis of list values
+(sensor * MAX_AXES + axis, see compact_sensor), so that every value of a
+board has its own index. A compact message (address and type tag included)
+takes 12 bytes, instead of 36 for an 'iif' message to /sensor/<name>.
+"""
+
+from osc import osc_prepared
+
+# Address of compact messages.
+COMPACT_ADDRESS = '/c'
+# Largest board id and sensor index.
+MAX_BOARD = 0xFF
+MAX_SENSOR = 0x7F
+# Axes per sensor in the sensor field (32 sensors of at most 4 axes).
+MAX_AXES = 4
+_WIDE_FLAG = 0x10000
+
+
+def compact_sensor(sensor: int, axis: int = 0) -> int:
+    """Sensor field of the value of an axis of a sensor.
+
+    Raises:
+      - ValueError: if the axis is out of range.
+    """
+    if not 0 <= axis < MAX_AXES:
+        raise ValueError('Axis out of range')
+    return sensor * MAX_AXES + axis
+
+
+def encode_word(board: int, sensor: int, value: float, bits: int = 16) -> int:
+    """Pack a normalised value with its board and sensor as a 32-bit word.
+
+    Args:
+      - board: Board identifier (0 to 255).
+      - sensor: Sensor index on the board (0 to 127).
+      - value: Normalised value, clipped to [0, 1].
+      - bits: Quantisation of the value (8 or 16).
+    Returns:
+      - The unsigned 32-bit word.
+    Raises:
+      - ValueError: if the board, sensor or bits are out of range.
+    """
+    if not 0 <= board <= MAX_BOARD or not 0 <= sensor <= MAX_SENSOR:
+        raise ValueError('Board or sensor out of range')
+    if bits == 16:
+        scale, flag = 0xFFFF, _WIDE_FLAG
+    elif bits == 8:
+        scale, flag = 0xFF, 0
+    else:
+        raise ValueError('Values are quantised on 8 or 16 bits')
+    value = min(1., max(0., value))
+    return (board << 24) | (sensor << 17) | flag | int(value * scale + 0.5)
+
+
+def decode_word(word: int):
+    """Unpack a compact word ('r' or 'i' argument).
+
+    Returns:
+      A tuple (board, sensor, value) with the value restored in [0, 1].
+    """
+    word &= 0xFFFFFFFF
+    scale = 0xFFFF if word & _WIDE_FLAG else 0xFF
+    return word >> 24, (word >> 17) & MAX_SENSOR, (word & 0xFFFF) / scale
+
+
+class OscCompactEncoder(object):
+    """Preallocated compact message, one word written in place per value."""
+
+    def __init__(self,
+            address: str = COMPACT_ADDRESS,
+            bits: int = 16,
+            typetag: str = 'r') -> None:
+        """Prepare the compact message.
+
+        Args:
+          - address: The osc address to send values to.
+          - bits: Quantisation of the values (8 or 16).
+          - typetag: Type of the word argument ('r' or 'i').
+        Raises:
+          - ValueError: if the bits or type tag are not supported.
+        """
+        if bits not in (8, 16):
+            raise ValueError('Values are quantised on 8 or 16 bits')
+        if typetag not in ('r', 'i'):
+            raise ValueError('Compact words are sent as r or i arguments')
+        self.bits = bits
+        self._signed = typetag == 'i'
+        self._msg = osc_prepared.OscPreparedMessage(address, typetag)
+
+    @property
+    def address(self) -> str:
+        """Returns the OSC address of the compact messages."""
+        return self._msg.address
+
+    def pack(self, board: int, sensor: int, value: float):
+        """Write one value in place and return the datagram."""
+        word = encode_word(board, sensor, value, self.bits)
+        if self._signed and word & 0x80000000:
+            word -= 0x100000000
+        return self._msg.pack(word)
+
+
+def decode_compact(params):
+    """Decode the arguments of a compact message.
+
+    Args:
+      params: The parameters of a parsed compact message.
+
+    Returns:
+      A list of (board, sensor, value) tuples, one per word.
+    """
+    return [decode_word(word) for word in params]
@@ -1,5 +1,6 @@
 """Representation of an OSC message in a pythonesque way."""
 
+from osc import osc_codec
 from osc import osc_types
 
 class ParseError(Exception):
@@ -11,12 +12,25 @@ class OscMessage(object):
 
     An OSC message consists of an OSC Address Pattern followed by an OSC
     Type Tag String followed by zero or more OSC Arguments.
+
+    The datagram is parsed lazily, the first time the address or the
+    parameters are accessed (parsing errors are raised at that point).
     """
 
     def __init__(self, dgram: bytes) -> None:
         self._dgram = dgram
-        self._parameters = []  # type: List[Any]
-        self._parse_datagram()
+        self._address_regexp = None
+        self._parameters = None  # type: List[Any]
+
+    def _parse(self) -> None:
+        """Parses the datagram if this has not been done yet."""
+        if self._parameters is None:
+            self._parameters = []
+            try:
+                self._parse_datagram()
+            except ParseError:
+                self._parameters = None
+                raise
 
     def _parse_datagram(self) -> None:
         try:
@@ -30,6 +44,12 @@ class OscMessage(object):
             if type_tag.startswith(','):
                 type_tag = type_tag[1:]
 
+            # Fixed-size type tags are decoded at once by a compiled codec.
+            codec = osc_codec.get_codec(type_tag)
+            if codec is not None and index + codec.size <= len(self._dgram):
+                self._parameters = codec.unpack_from(self._dgram, index)
+                return
+
             params = []  # type: List[Any]
             param_stack = [params]
             # Parse each parameter given its type.
@@ -81,6 +101,7 @@ class OscMessage(object):
     @property
     def address(self) -> str:
         """Returns the OSC address regular expression."""
+        self._parse()
         return self._address_regexp
 
     @staticmethod
@@ -105,4 +126,5 @@ class OscMessage(object):
 
     def __iter__(self):
         """Returns an iterator over the parameters of this message."""
+        self._parse()
         return iter(self._parameters)
@@ -1,5 +1,6 @@
 """Build OSC messages for client applications."""
 
+from osc import osc_codec
 from osc import osc_message
 from osc import osc_types
 
@@ -118,46 +119,54 @@ class OscMessageBuilder(object):
             raise ValueError('Infered arg_value type is not supported')
         return arg_type
 
-    def build(self) -> osc_message.OscMessage:
-        """Builds an OscMessage from the current state of this builder.
+    def build_dgram(self) -> bytes:
+        """Encodes the current state of this builder as a raw datagram.
+
+        Unlike build, the datagram is not wrapped into an OscMessage, which
+        avoids any parsing work on the send path.
 
         Raises:
           - BuildError: if the message could not be build or if the address
                         was empty.
 
         Returns:
-          - an osc_message.OscMessage instance.
+          - the datagram of the message as bytes.
         """
         if not self._address:
             raise BuildError('OSC addresses cannot be empty')
-        dgram = b''
         try:
             # Write the address.
-            dgram += osc_types.write_string(self._address)
+            dgram = [osc_types.write_string(self._address)]
             if not self._args:
-                dgram += osc_types.write_string(',')
-                return osc_message.OscMessage(dgram)
+                dgram.append(osc_types.write_string(','))
+                return b''.join(dgram)
 
             # Write the parameters.
             arg_types = "".join([arg[0] for arg in self._args])
-            dgram += osc_types.write_string(',' + arg_types)
+            dgram.append(osc_types.write_string(',' + arg_types))
+            # Fixed-size type tags are encoded at once by a compiled codec.
+            codec = osc_codec.get_codec(arg_types)
+            if codec is not None:
+                dgram.append(codec.pack([value for arg_type, value in self._args
+                                         if arg_type not in 'TFN']))
+                return b''.join(dgram)
             for arg_type, value in self._args:
                 if arg_type == self.ARG_TYPE_STRING:
-                    dgram += osc_types.write_string(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_string(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_INT:
-                    dgram += osc_types.write_int(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_int(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_INT64:
-                    dgram += osc_types.write_int64(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_int64(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_FLOAT:
-                    dgram += osc_types.write_float(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_float(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_DOUBLE:
-                    dgram += osc_types.write_double(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_double(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_BLOB:
-                    dgram += osc_types.write_blob(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_blob(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_RGBA:
-                    dgram += osc_types.write_rgba(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_rgba(value))  # type: ignore[arg-type]
                 elif arg_type == self.ARG_TYPE_MIDI:
-                    dgram += osc_types.write_midi(value)  # type: ignore[arg-type]
+                    dgram.append(osc_types.write_midi(value))  # type: ignore[arg-type]
                 elif arg_type in (self.ARG_TYPE_TRUE,
                                   self.ARG_TYPE_FALSE,
                                   self.ARG_TYPE_ARRAY_START,
@@ -168,6 +177,18 @@ class OscMessageBuilder(object):
                     raise BuildError('Incorrect parameter type found {}'.format(
                         arg_type))
 
-            return osc_message.OscMessage(dgram)
+            return b''.join(dgram)
         except osc_types.BuildError as be:
             raise BuildError('Could not build the message: {}'.format(be))
+
+    def build(self) -> osc_message.OscMessage:
+        """Builds an OscMessage from the current state of this builder.
+
+        Raises:
+          - BuildError: if the message could not be build or if the address
+                        was empty.
+
+        Returns:
+          - an osc_message.OscMessage instance.
+        """
+        return osc_message.OscMessage(self.build_dgram())
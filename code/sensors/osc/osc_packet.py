@@ -0,0 +1,66 @@
+"""Use OSC packets to parse incoming UDP packets into messages or bundles.
+
+It lets you access easily to OscMessage and OscBundle instances in the packet.
+"""
+
+try:
+    from ucollections import namedtuple
+except ImportError:
+    from collections import namedtuple
+
+from osc import osc_bundle
+from osc import osc_message
+from osc import osc_types
+
+# A namedtuple as returned by the messages property, with the timestamp of
+# the enclosing bundle (or IMMEDIATELY for a bare message).
+TimedMessage = namedtuple('TimedMessage', ('time', 'message'))
+
+
+class ParseError(Exception):
+    """Base error thrown when a packet could not be parsed."""
+
+
+def _timed_msg_of_bundle(bundle: osc_bundle.OscBundle, messages: list) -> None:
+    """Flattens the messages of a bundle (and its sub-bundles), in order."""
+    for content in bundle:
+        if type(content) is osc_message.OscMessage:
+            messages.append(TimedMessage(bundle.timestamp, content))
+        else:
+            _timed_msg_of_bundle(content, messages)
+
+
+class OscPacket(object):
+    """Unit of transmission of the OSC protocol.
+
+    Any application that sends OSC Packets is an OSC Client.
+    Any application that receives OSC Packets is an OSC Server.
+    """
+
+    def __init__(self, dgram: bytes) -> None:
+        """Initialize an OscPacket with the given UDP datagram.
+
+        Args:
+          - dgram: the raw UDP datagram holding the OSC packet.
+
+        Raises:
+          - ParseError if the datagram could not be parsed. The messages
+            inside bundles are parsed lazily, and only raise
+            osc_message.ParseError when their address or params are read.
+        """
+        try:
+            if osc_bundle.OscBundle.dgram_is_bundle(dgram):
+                self._messages = []
+                _timed_msg_of_bundle(osc_bundle.OscBundle(dgram), self._messages)
+            elif osc_message.OscMessage.dgram_is_message(dgram):
+                self._messages = [TimedMessage(osc_types.IMMEDIATELY, osc_message.OscMessage(dgram))]
+            else:
+                # Empty packet, should not happen as per the spec but heh.
+                raise ParseError('OSC Packet should at least contain an OscMessage or an OscBundle.')
+        except osc_bundle.ParseError as pe:
+            raise ParseError('Could not parse packet %s' % pe)
+
+    @property
+    def messages(self):
+        """Returns the list of TimedMessage contained in this packet, in order."""
+        return self._messages
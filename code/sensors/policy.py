@@ -0,0 +1,76 @@
+"""
+
+ ~ ESP-32 // Micropython ~
+ policy.py : Transmission policy of the sensor values
+
+ A value is only sent when it moved away from the last sent value by more
+ than a deadband (absolute, or relative to the last value), with an extra
+ hysteresis when it changes direction. The minimum interval limits the send
+ rate, and the maximum interval forces a refresh (keyframe) of static values.
+ Without deadband (the default), every value is sent.
+
+ Licence            : CC-NC-BY-SA 4.0
+ Author             : Philippe Esling
+                     <esling@ircam.fr>
+
+"""
+from utils import ticks_ms, ticks_diff
+
+class SendPolicy:
+    """
+    Decides which values of a sensor are worth sending.
+
+    Example :
+    >>> policy = SendPolicy(deadband = 0.01, max_interval_ms = 1000)
+    >>> if policy.should_send(value):
+    >>>     osc.send_prepared(msg, b_id, i, value)
+    """
+
+    def __init__(self,
+            deadband: float = 0.,
+            relative: float = 0.,
+            min_interval_ms: int = 0,
+            max_interval_ms: int = 0,
+            hysteresis: float = 0.):
+        """
+        Args:
+            deadband: Minimum absolute change to send a value (0 to send all)
+            relative: Minimum change relative to the last sent value (0 for none)
+            min_interval_ms: Minimum time between two sends (0 for none)
+            max_interval_ms: Maximum time without send (0 for none)
+            hysteresis: Extra change needed when the direction reverses
+        """
+        self.deadband = deadband
+        self.relative = relative
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.hysteresis = hysteresis
+        self.last_value = None
+        self.last_time = 0
+        self.direction = 0
+        # Statistics
+        self.sent = 0
+        self.suppressed = 0
+
+    def should_send(self, value: float, now: int = None) -> bool:
+        """ Whether the value must be sent (updates the state if so) """
+        if now is None:
+            now = ticks_ms()
+        if self.last_value is not None:
+            elapsed = ticks_diff(now, self.last_time)
+            if elapsed < self.min_interval_ms:
+                self.suppressed += 1
+                return False
+            if not self.max_interval_ms or elapsed < self.max_interval_ms:
+                change = value - self.last_value
+                threshold = max(self.deadband, self.relative * abs(self.last_value))
+                if (change > 0) != (self.direction > 0) and self.direction:
+                    threshold += self.hysteresis
+                if threshold and abs(change) <= threshold:
+                    self.suppressed += 1
+                    return False
+                self.direction = 1 if change > 0 else -1
+        self.last_value = value
+        self.last_time = now
+        self.sent += 1
+        return True
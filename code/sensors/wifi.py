@@ -9,66 +9,273 @@
 
 """
 import network
+import binascii
+import json
 import time
 
+# Link states
+IDLE = 0
+ASSOCIATING = 1
+GOT_IP = 2
+LOST = 3
+STATE_NAMES = ["Idle", "Associating", "Got IP", "Lost"]
+
 class WiFi():
     """
     Generic class for using WiFi on ESP32.
     This class allows to scan for accessible networks and connect to it.
+    The last working network (SSID, BSSID, channel and IP configuration) is
+    cached in flash, so that the next connection skips the scan and DHCP.
+    Otherwise, the configured networks are tried ranked by signal strength.
+
+    The connection runs as a state machine (IDLE, ASSOCIATING, GOT_IP, LOST)
+    advanced by tick without blocking (except for the scan of the fallback,
+    whose ranking is reused for scan_interval_ms), so that it can be handled
+    from the main loop. A lost link is detected and
+    reconnected automatically.
+
+    Example :
+    >>> wifi = WiFi(config = wifi_config)
+    >>> if wifi.tick(): # From the main loop, True when the state changed
+    >>>     print(wifi.state_name())
     """
-    
-    __authmodes = ['Open', 'WEP', 'WPA-PSK' 'WPA2-PSK4', 'WPA/WPA2-PSK', 'Unknown']
-    
+
+    __authmodes = ['Open', 'WEP', 'WPA-PSK', 'WPA2-PSK', 'WPA/WPA2-PSK', 'Unknown']
+
     def __init__(self,
             ssid: str = "",
             password: str = "",
             scan: bool = True,
             verbose: bool = True,
-            config: dict = None
+            config: dict = None,
+            cache: str = "configs/wifi_cache.json",
+            timeout_ms: int = 10000,
+            retry_ms: int = 1000,
+            scan_interval_ms: int = 30000
         ):
         if (config is not None):
             scan = config["scan"]
             verbose = config["verbose"]
-            ssid = config["networks"][0]["ssid"]
-            password = config["networks"][0]["password"]
-        # Register the network
-        self.ssid = ssid
-        self.password = password
+            networks = config["networks"]
+        else:
+            networks = [{"ssid": ssid, "password": password}]
+        # Register the networks (first one by default)
+        self.networks = networks
+        self.ssid = networks[0]["ssid"]
+        self.password = networks[0]["password"]
+        self.verbose = verbose
+        self.cache = cache
+        self.timeout_ms = timeout_ms
+        self.retry_ms = retry_ms
+        self.scan_interval_ms = scan_interval_ms
+        # Time taken by the last association
+        self.assoc_ms = 0
+        # Results of the last scan (used once when connecting)
+        self.last_scan = None
+        # Connection state machine
+        self.state = IDLE
+        self.since = time.ticks_ms()
+        self.candidates = None
+        self.scanned = False
+        # Ranking of the last scan (reused for scan_interval_ms) and its time
+        self.ranking = None
+        self.ranked_at = 0
+        self.target = None
+        self.cached = None
+        self.retry_at = None
+        # Statistics
+        self.state_changes = 0
+        self.attempts = 0
+        self.connections = 0
+        self.losses = 0
         # Create a WLAN station
         self.station = network.WLAN(network.STA_IF)
         self.station.active(True)
         # Scan for networks
         if (scan):
             self.scan()
-        
+
     def scan(self):
         """ Function to scan for networks """
         print("Scanning for WiFi networks ...")
-        for ssid, bssid, channel, RSSI, authmode, hidden in self.station.scan():
+        results = self.station.scan()
+        self.last_scan = results
+        for ssid, bssid, channel, RSSI, authmode, hidden in results:
             print("* {:s}".format(ssid))
             print("   - Channel: {}".format(channel))
             print("   - RSSI: {}".format(RSSI))
             print("   - BSSID: {:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}".format(*bssid))
-            print("   - Authentication: {}".format(self.__authmodes[authmode]))
+            print("   - Authentication: {}".format(self.__authmodes[min(authmode, len(self.__authmodes) - 1)]))
             print("   - Hidden: {}".format(hidden))
-    
+        return results
+
+    def password_of(self, ssid: str):
+        """ Password of a configured network (None if not configured) """
+        for net in self.networks:
+            if net["ssid"] == ssid:
+                return net["password"]
+        return None
+
+    def ranked(self, results: list = None) -> list:
+        """ Configured networks in range, as (ssid, bssid, channel) by decreasing RSSI """
+        if results is None:
+            results = self.station.scan()
+        self.last_scan = None
+        best = {}
+        for ssid, bssid, channel, RSSI, authmode, hidden in results:
+            ssid = ssid.decode() if isinstance(ssid, bytes) else ssid
+            if self.password_of(ssid) is None:
+                continue
+            if ssid not in best or RSSI > best[ssid][3]:
+                best[ssid] = (ssid, bssid, channel, RSSI)
+        ranked = sorted(best.values(), key = lambda n: -n[3])
+        return [n[:3] for n in ranked]
+
+    def load_cache(self):
+        """ Last working network cached in flash (None if absent or not configured) """
+        try:
+            with open(self.cache) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.password_of(cached.get("ssid")) is None:
+            return None
+        return cached
+
+    def save_cache(self, ssid: str, bssid: bytes, channel: int, previous: dict = None):
+        """ Cache the current network and IP configuration in flash (if changed) """
+        cached = {
+            "ssid": ssid,
+            "bssid": binascii.hexlify(bssid).decode() if bssid else "",
+            "channel": channel,
+            "ifconfig": list(self.station.ifconfig())}
+        if cached == previous:
+            return
+        try:
+            with open(self.cache, "w") as f:
+                json.dump(cached, f)
+        except OSError as error:
+            print(f'Could not cache WiFi: {error}')
+
+    def failed(self) -> bool:
+        """ Whether the current association attempt was rejected """
+        return self.station.status() in (
+            getattr(network, "STAT_WRONG_PASSWORD", None),
+            getattr(network, "STAT_NO_AP_FOUND", None),
+            getattr(network, "STAT_CONNECT_FAIL", None))
+
+    def begin(self, ssid: str, bssid: bytes = None, ifconfig = None) -> bool:
+        """ Start associating with one network (optionally a given AP and static IP) """
+        if self.station.isconnected():
+            self.station.disconnect()
+        try:
+            # Static IP (skips DHCP) or back to DHCP
+            self.station.ifconfig(tuple(ifconfig) if ifconfig else "dhcp")
+        except (OSError, TypeError, ValueError):
+            pass
+        self.attempts += 1
+        try:
+            if bssid:
+                self.station.connect(ssid, self.password_of(ssid), bssid = bssid)
+            else:
+                self.station.connect(ssid, self.password_of(ssid))
+        except OSError as error:
+            print(f'{error}')
+            return False
+        return True
+
+    def set_state(self, state: int):
+        self.state = state
+        self.since = time.ticks_ms()
+        self.state_changes += 1
+        if (self.verbose):
+            print("WiFi: " + STATE_NAMES[state])
+
+    def state_name(self) -> str:
+        return STATE_NAMES[self.state]
+
+    def next_candidate(self):
+        """ Next network to try as (ssid, bssid, channel, ifconfig), None when all failed """
+        if self.candidates is None:
+            # New round: cached network first (fast reconnect)
+            self.cached = self.load_cache()
+            self.scanned = False
+            self.candidates = []
+            if self.cached is not None:
+                bssid = binascii.unhexlify(self.cached["bssid"]) if self.cached["bssid"] else None
+                self.candidates.append((self.cached["ssid"], bssid, self.cached["channel"], self.cached["ifconfig"]))
+        if not self.candidates and not self.scanned:
+            # Configured networks by decreasing RSSI (blocking scan at most every scan_interval_ms)
+            self.scanned = True
+            now = time.ticks_ms()
+            if self.ranking is None or self.last_scan is not None or time.ticks_diff(now, self.ranked_at) >= self.scan_interval_ms:
+                self.ranking = self.ranked(self.last_scan)
+                self.ranked_at = now
+            self.candidates = [n + (None,) for n in self.ranking]
+        if not self.candidates:
+            self.candidates = None
+            return None
+        return self.candidates.pop(0)
+
+    def tick(self) -> bool:
+        """ Advance the connection without blocking, returns True if the state changed """
+        now = time.ticks_ms()
+        if self.state == GOT_IP:
+            if not self.station.isconnected():
+                self.losses += 1
+                self.set_state(LOST)
+                return True
+            return False
+        if self.state == ASSOCIATING:
+            elapsed = time.ticks_diff(now, self.since)
+            if self.station.isconnected():
+                self.assoc_ms = elapsed
+                self.ssid = self.target[0]
+                self.password = self.password_of(self.ssid)
+                self.save_cache(self.ssid, self.target[1], self.target[2], self.cached)
+                self.candidates = None
+                self.connections += 1
+                self.set_state(GOT_IP)
+                print("Connected to %s in %d ms, IP %s"%(self.ssid, self.assoc_ms, self.ip()))
+                return True
+            if self.failed() or elapsed >= self.timeout_ms:
+                self.station.disconnect()
+                self.set_state(IDLE)
+                return True
+            return False
+        # IDLE or LOST: try the next candidate (new round retry_ms after a failed one)
+        if self.retry_at is not None and time.ticks_diff(self.retry_at, now) > 0:
+            return False
+        self.target = self.next_candidate()
+        if self.target is None:
+            self.retry_at = time.ticks_add(now, self.retry_ms)
+            if self.state != IDLE:
+                self.set_state(IDLE)
+                return True
+            return False
+        self.retry_at = None
+        print("Connecting to " + self.target[0] + " ...")
+        if not self.begin(self.target[0], self.target[1], self.target[3]):
+            return False
+        self.set_state(ASSOCIATING)
+        return True
+
     def connect(self):
-        while not self.station.isconnected():
-            print("Connecting...")
-            try:
-                self.station.connect(self.ssid, self.password)
-            except OSError as error:
-                print(f'{error}')
-                time.sleep(1)
+        """ Connect (blocking) through the state machine """
+        start = time.ticks_ms()
+        while self.state != GOT_IP:
+            self.tick()
+            time.sleep_ms(10)
         print("Connected!")
+        print("Association time: %d ms (total %d ms)"%(self.assoc_ms, time.ticks_diff(time.ticks_ms(), start)))
         print("My IP Address:", self.station.ifconfig()[0])
         print("Whole config:", self.station.ifconfig())
-        
+
     def connected(self) -> bool:
         return self.station.isconnected()
-    
+
     def ip(self) -> str:
         return self.station.ifconfig()[0]
-    
+
     def mac(self) -> str:
         return self.station.config("mac")